@@ -27,6 +27,8 @@ from flask_sslify import SSLify
 
 from app.frs import Swaggerify
 from app.helper import gen_tables
+from app.history import PriceHistory
+from app.jobs import JobQueue
 
 from builtins import *  # noqa  # pylint: disable=unused-import
 
@@ -43,6 +45,8 @@ __copyright__ = 'Copyright 2017 Reuben Cummings'
 cache = Cache()
 compress = Compress()
 swag = Swaggerify()
+history = PriceHistory()
+jobs = JobQueue(cache)
 
 CACHE_RESULT = [{'name': 'objects', 'desc': 'Success message', 'type': 'str'}]
 LOREM_RESULT = [{'name': 'objects', 'desc': 'Bacon sentence', 'type': 'str'}]
@@ -59,6 +63,90 @@ SEARCH_RESULT = [
     {'name': 'url', 'desc': 'Affliate link', 'type': 'str'},
 ]
 
+HISTORY_RESULT = [
+    {'name': 'currency', 'desc': 'Currency', 'type': 'str'},
+    {'name': 'price', 'desc': 'Amazon price', 'type': 'float'},
+    {'name': 'sales_rank', 'desc': 'Amazon sales rank', 'type': 'int'},
+    {'name': 'utc', 'desc': 'Fetch time (unix timestamp)', 'type': 'int'},
+]
+
+SUMMARY_RESULT = [
+    {'name': 'count', 'desc': 'Number of prices fetched', 'type': 'int'},
+    {'name': 'latest', 'desc': 'Latest price record', 'type': 'dict'},
+    {'name': 'max', 'desc': 'Maximum price', 'type': 'float'},
+    {'name': 'min', 'desc': 'Minimum price', 'type': 'float'},
+]
+
+JOB_RESULT = [
+    {'name': 'id', 'desc': 'The job id', 'type': 'str'},
+    {
+        'name': 'status',
+        'desc': "One of ['pending', 'running', 'done', 'failed']",
+        'type': 'str'},
+    {'name': 'progress', 'desc': 'Number of results so far', 'type': 'int'},
+    {'name': 'error', 'desc': 'Why the job failed', 'type': 'str'},
+    {'name': 'created', 'desc': 'Time the job was queued', 'type': 'datetime'},
+    {'name': 'updated', 'desc': 'Time of the last update', 'type': 'datetime'},
+]
+
+SUGGEST_RESULT = [
+    {
+        'name': 'asin', 'desc': 'Amazon Standard Identification Number',
+        'type': 'str'},
+    {'name': 'title', 'desc': 'Item title', 'type': 'str'},
+    {'name': 'model', 'desc': 'Item model', 'type': 'str'},
+]
+
+WATCH_RESULT = [
+    {
+        'name': 'asin', 'desc': 'Amazon Standard Identification Number',
+        'type': 'str'},
+    {'name': 'region', 'desc': 'The localized Amazon site', 'type': 'str'},
+    {'name': 'price', 'desc': 'Current price', 'type': 'float'},
+    {'name': 'currency', 'desc': 'Price currency', 'type': 'str'},
+    {'name': 'sales_rank', 'desc': 'Current sales rank', 'type': 'int'},
+]
+
+STATS_RESULT = [
+    {
+        'name': 'chunk_misses', 'desc': 'Chunked reads missing a chunk',
+        'type': 'int'},
+    {'name': 'chunked', 'desc': 'Values stored in chunks', 'type': 'int'},
+    {'name': 'chunks', 'desc': 'Chunks stored', 'type': 'int'},
+    {'name': 'oversize', 'desc': 'Values compressed', 'type': 'int'},
+    {
+        'name': 'disk_hits', 'desc': 'Values read back from the disk cache',
+        'type': 'int'},
+    {
+        'name': 'evicted', 'desc': 'Values evicted from the disk cache',
+        'type': 'int'},
+]
+
+
+def get_cache_config(config):
+    cache_config = {}
+
+    if config['HEROKU']:
+        cache_config['CACHE_TYPE'] = 'app.backends.pooled_memcached'
+        cache_config['CACHE_MEMCACHED_SERVERS'] = [getenv('MEMCACHIER_SERVERS')]
+        cache_config['CACHE_MEMCACHED_USERNAME'] = getenv('MEMCACHIER_USERNAME')
+        cache_config['CACHE_MEMCACHED_PASSWORD'] = getenv('MEMCACHIER_PASSWORD')
+    elif config['SHARED_CACHE']:
+        cache_config['CACHE_TYPE'] = 'app.backends.shared_memory'
+    elif config['DEBUG_MEMCACHE']:
+        cache_config['CACHE_TYPE'] = 'app.backends.pooled_memcached'
+        cache_config['CACHE_MEMCACHED_SERVERS'] = [getenv('MEMCACHE_SERVERS')]
+    else:
+        cache_config['CACHE_TYPE'] = 'simple'
+
+    if config['DISK_CACHE']:
+        # The disk cache sits behind any shared cache
+        front = cache_config['CACHE_TYPE']
+        cache_config['CACHE_TYPE'] = 'app.backends.disk'
+        cache_config['DISK_CACHE_FRONT'] = None if front == 'simple' else front
+
+    return cache_config
+
 
 def create_app(config_mode=None, config_file=None):
     # Create webapp instance
@@ -66,7 +154,6 @@ def create_app(config_mode=None, config_file=None):
     app.register_blueprint(blueprint)
     CORS(app)
     compress.init_app(app)
-    cache_config = {}
 
     if config_mode:
         app.config.from_object(getattr(config, config_mode))
@@ -78,18 +165,9 @@ def create_app(config_mode=None, config_file=None):
     if app.config.get('SERVER_NAME'):
         SSLify(app)
 
-    if app.config['HEROKU']:
-        cache_config['CACHE_TYPE'] = 'saslmemcached'
-        cache_config['CACHE_MEMCACHED_SERVERS'] = [getenv('MEMCACHIER_SERVERS')]
-        cache_config['CACHE_MEMCACHED_USERNAME'] = getenv('MEMCACHIER_USERNAME')
-        cache_config['CACHE_MEMCACHED_PASSWORD'] = getenv('MEMCACHIER_PASSWORD')
-    elif app.config['DEBUG_MEMCACHE']:
-        cache_config['CACHE_TYPE'] = 'memcached'
-        cache_config['CACHE_MEMCACHED_SERVERS'] = [getenv('MEMCACHE_SERVERS')]
-    else:
-        cache_config['CACHE_TYPE'] = 'simple'
-
-    cache.init_app(app, config=cache_config)
+    cache.init_app(app, config=get_cache_config(app.config))
+    history.init_app(app)
+    jobs.init_app(app)
 
     skwargs = {
         'name': app.config['APP_NAME'], 'version': __version__,
@@ -125,9 +203,20 @@ def create_app(config_mode=None, config_file=None):
     create_defs({'columns': CACHE_RESULT, 'name': 'delete_result'})
     create_defs({'columns': LOREM_RESULT, 'name': 'lorem_result'})
     create_defs({'columns': SEARCH_RESULT, 'name': 'search_result'})
+    create_defs({'columns': SEARCH_RESULT, 'name': 'item_result'})
+    create_defs({'columns': HISTORY_RESULT, 'name': 'history_result'})
+    create_defs({'columns': SUMMARY_RESULT, 'name': 'summary_result'})
+    create_defs({'columns': STATS_RESULT, 'name': 'stats_result'})
+    create_defs({'columns': JOB_RESULT, 'name': 'jobs_result'})
+    create_defs({'columns': JOB_RESULT, 'name': 'job_result'})
+    create_defs({'columns': WATCH_RESULT, 'name': 'watch_result'})
+    create_defs({'columns': SUGGEST_RESULT, 'name': 'suggest_result'})
 
     with app.app_context():
-        for table in gen_tables(app.view_functions, **app.config):
+        tables = gen_tables(
+            app.view_functions, url_map=app.url_map, **app.config)
+
+        for table in tables:
             create_docs(table)
 
     return app
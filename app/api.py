@@ -5,10 +5,388 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
-from os import getenv
-from amazon.api import AmazonAPI
+import socket
+
+from os import getenv, getpid
+from functools import partial
+from heapq import nsmallest
+from itertools import chain, islice
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+try:
+    from urllib.error import URLError, HTTPError
+except ImportError:
+    from urllib2 import URLError, HTTPError
+
+from lxml import etree
+from amazon.api import (
+    AmazonAPI, LookupException, SearchException, NoMorePages, DOMAINS,
+    AMAZON_ASSOCIATES_BASE_URL)
+
+from app.breaker import get_tracker, hedge
+
 from builtins import *  # noqa  # pylint: disable=unused-import
 
+# Amazon accepts at most 10 ASINs per ItemLookup request
+MAX_LOOKUP_IDS = 10
+
+# Number of concurrent ItemLookup requests each process makes (see `get_pool`)
+LOOKUP_WORKERS = 4
+
+# Element paths (relative to an `Item`) of the fields `Amazon.parse` reads.
+# Like `AmazonProduct`, only the first matching child of each step is used.
+ITEM_PATHS = {
+    'asin': 'ASIN',
+    'model': 'ItemAttributes.Model',
+    'title': 'ItemAttributes.Title',
+    'sales_rank': 'SalesRank',
+    'sale_price': 'Offers.Offer.OfferListing.SalePrice.Amount',
+    'sale_currency': 'Offers.Offer.OfferListing.SalePrice.CurrencyCode',
+    'list_price': 'Offers.Offer.OfferListing.Price.Amount',
+    'list_currency': 'Offers.Offer.OfferListing.Price.CurrencyCode',
+    'lowest_price': 'OfferSummary.LowestNewPrice.Amount',
+    'lowest_currency': 'OfferSummary.LowestNewPrice.CurrencyCode',
+}
+
+# Element paths relative to the response root
+ROOT_PATHS = {
+    'is_valid': 'Items.Request.IsValid',
+    'error_code': 'Items.Request.Errors.Error.Code',
+    'error_msg': 'Items.Request.Errors.Error.Message',
+    'total_pages': 'Items.TotalPages',
+}
+
+# The smallest response group that includes each field
+FIELD_GROUPS = {
+    'asin': 'ItemIds',
+    'country': 'ItemIds',
+    'url': 'ItemIds',
+    'title': 'Small',
+    'model': 'ItemAttributes',
+    'price': 'OfferSummary',
+    'currency': 'OfferSummary',
+    'sales_rank': 'SalesRank',
+}
+
+# The fields search results can be sorted by
+SORT_FIELDS = {'price', 'sales_rank'}
+
+# The exception and message prefix used for errors of each operation
+ERRORS = {
+    'ItemSearch': (SearchException, 'Amazon Search Error'),
+    'ItemLookup': (LookupException, 'Amazon Product Lookup Error'),
+}
+
+# The errors that mean an Amazon region is unreachable or unhealthy (but see
+# `is_upstream_error`)
+UPSTREAM_ERRORS = (URLError, socket.error, socket.timeout)
+
+_XPATHS = {}
+_POOLS = {}
+_POOLS_LOCK = Lock()
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def get_pool(size):
+    """Gets this process's shared thread pool of a given size
+
+    So the total number of concurrent requests is bounded, however many
+    requests share the pool.
+
+    Args:
+        size (int): Number of threads
+
+    Examples:
+        >>> get_pool(2) is get_pool(2)
+        True
+    """
+    # Threads don't survive a fork so each worker process needs its own
+    key = (getpid(), size)
+
+    if key not in _POOLS:
+        with _POOLS_LOCK:
+            if key not in _POOLS:
+                _POOLS[key] = ThreadPool(size)
+
+    return _POOLS[key]
+
+
+def is_upstream_error(err):
+    """Determines if an error means an Amazon region is unhealthy
+
+    Amazon answers bad requests (e.g., an invalid associate tag or signature)
+    with a 4xx `HTTPError`, which says nothing about the region's health.
+
+    Examples:
+        >>> is_upstream_error(URLError('timed out'))
+        True
+        >>> is_upstream_error(HTTPError('url', 503, 'Unavailable', {}, None))
+        True
+        >>> is_upstream_error(HTTPError('url', 403, 'Forbidden', {}, None))
+        False
+        >>> is_upstream_error(ValueError())
+        False
+    """
+    if isinstance(err, HTTPError):
+        return err.code >= 500
+    else:
+        return isinstance(err, UPSTREAM_ERRORS)
+
+
+def get_deadline(timeout=None):
+    return None if timeout is None else monotonic() + float(timeout)
+
+
+def get_xpaths(namespace=None):
+    """Compiles (once per namespace) the XPath expressions used to extract
+    items from an Amazon API response
+
+    Args:
+        namespace (str): The response's XML namespace
+
+    Returns:
+        dict: The compiled expressions
+
+    Examples:
+        >>> xpaths = get_xpaths()
+        >>> xpaths['items'].path == 'Items[1]/Item'
+        True
+        >>> xpaths['asin'].path == 'ASIN[1]'
+        True
+    """
+    if namespace not in _XPATHS:
+        prefix = 'a:' if namespace else ''
+        namespaces = {'a': namespace} if namespace else None
+        step = '{}{{}}[1]'.format(prefix)
+        compile_ = partial(etree.XPath, namespaces=namespaces)
+        paths = dict(ITEM_PATHS, **ROOT_PATHS)
+
+        xpaths = dict(
+            (k, compile_('/'.join(map(step.format, v.split('.')))))
+            for k, v in paths.items())
+
+        xpaths['items'] = compile_('{0}Items[1]/{0}Item'.format(prefix))
+        _XPATHS[namespace] = xpaths
+
+    return _XPATHS[namespace]
+
+
+def get_response_group(fields=None):
+    """Determines the smallest response group that includes the given fields
+
+    Args:
+        fields (Iterable[str]): The required fields (default: all)
+
+    Returns:
+        str: The response group(s)
+
+    Examples:
+        >>> get_response_group() == 'Medium'
+        True
+        >>> get_response_group(['asin', 'url']) == 'ItemIds'
+        True
+        >>> get_response_group(['asin', 'title', 'price']) == (
+        ...     'OfferSummary,Small')
+        True
+        >>> get_response_group(['title', 'model']) == 'ItemAttributes'
+        True
+    """
+    if not fields:
+        return 'Medium'
+
+    groups = set(FIELD_GROUPS[field] for field in fields)
+
+    if 'ItemAttributes' in groups:
+        # ItemAttributes includes the Small attributes we need (Title)
+        groups.discard('Small')
+
+    if len(groups) > 1:
+        # every other response group includes the ASIN
+        groups.discard('ItemIds')
+
+    return ','.join(sorted(groups))
+
+
+def get_namespace(root):
+    return root.tag[1:].split('}')[0] if root.tag.startswith('{') else None
+
+
+def is_truthy(text):
+    """Determines the truthiness lxml.objectify would give an element's text,
+    i.e., empty, zero, and false values are falsy
+
+    Examples:
+        >>> [is_truthy(t) for t in ('B00X', '1999', '0', '0.00', '', None)]
+        [True, True, False, False, False, False]
+    """
+    try:
+        return bool(text) and text != 'false' and float(text) != 0
+    except ValueError:
+        return True
+
+
+def get_text(xpath, element):
+    found = xpath(element)
+    text = found[0].text if found else None
+    return text if is_truthy(text) else None
+
+
+def get_field(xpaths, element, field):
+    return get_text(xpaths[field], element)
+
+
+def check_errors(root, operation):
+    """Raises the error of an Amazon API response, if any
+
+    Like `AmazonSearch` and `AmazonAPI.lookup`, a response is an error if it
+    isn't valid, or if it has errors and no items (e.g., a search without
+    matches).
+
+    Args:
+        root (obj): The response root (an `lxml.etree.Element`)
+        operation (str): The API operation (one of `ERRORS`)
+
+    Examples:
+        >>> xml = (
+        ...     '<ItemSearchResponse><Items><Request><IsValid>True</IsValid>'
+        ...     '<Errors><Error><Code>AWS.ECommerceService.NoExactMatches'
+        ...     '</Code><Message>No results</Message></Error></Errors>'
+        ...     '</Request></Items></ItemSearchResponse>')
+        >>> root = etree.fromstring(xml)
+        >>> check_errors(root, 'ItemSearch') # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+        ...
+        SearchException: NoExactMatches
+    """
+    xpaths = get_xpaths(get_namespace(root))
+    get = partial(get_field, xpaths, root)
+    failed = get('error_code') and not xpaths['items'](root)
+
+    if get('is_valid') == 'False' or failed:
+        code, msg = get('error_code'), get('error_msg')
+        error, prefix = ERRORS[operation]
+
+        if code == 'AWS.ParameterOutOfRange' and error is SearchException:
+            raise NoMorePages(msg)
+        else:
+            raise error("{0}: '{1}', '{2}'".format(prefix, code, msg))
+
+
+def get_price(get, region='US'):
+    # Like `AmazonProduct.price_and_currency`, except that yen amounts aren't
+    # divided (the yen has no minor unit)
+    price = get('sale_price')
+
+    if price:
+        currency = get('sale_currency')
+    else:
+        price = get('list_price')
+
+        if price:
+            currency = get('list_currency')
+        else:
+            price = get('lowest_price')
+            currency = get('lowest_currency')
+
+    if price and 'JP' not in region:
+        price = float(price) / 100
+    elif price:
+        price = float(price)
+
+    return (price, currency) if price else (None, None)
+
+
+def get_sort_key(sort):
+    """Creates the sort key of items
+
+    Values are compared numerically, and items without a value (or price) sort
+    last.
+
+    Args:
+        sort (str): The field to sort by, prefixed with '-' for descending
+            order (one of ['price', 'sales_rank', '-price', '-sales_rank'])
+
+    Returns:
+        func: The sort key
+
+    Examples:
+        >>> items = [{'price': 5}, {'price': 0}, {'price': 30}]
+        >>> [i['price'] for i in sorted(items, key=get_sort_key('price'))]
+        [5, 30, 0]
+        >>> [i['price'] for i in sorted(items, key=get_sort_key('-price'))]
+        [30, 5, 0]
+        >>> ranks = [{'sales_rank': '9'}, {'sales_rank': '10'}]
+        >>> key = get_sort_key('sales_rank')
+        >>> [i['sales_rank'] for i in sorted(ranks, key=key)] == ['9', '10']
+        True
+    """
+    field = sort.lstrip('-')
+    sign = -1 if sort.startswith('-') else 1
+
+    if field not in SORT_FIELDS:
+        msg = 'Invalid sort: {}. Choose from {}.'
+        raise ValueError(msg.format(sort, sorted(SORT_FIELDS)))
+
+    def key(item):
+        value = item.get(field)
+        return (0, sign * float(value)) if value else (1, 0)
+
+    return key
+
+
+def select(items, min_price=None, max_price=None, sort=None, top=None):
+    """Filters items by price, and sorts them
+
+    With `top`, the items are ranked with a heap of `top` items instead of a
+    full sort. `items` is read once, so an iterator of items is never held in
+    memory as a whole.
+
+    Args:
+        items (Iterable[dict]): The items (see `Amazon.parse`)
+        min_price (float): The minimum price
+        max_price (float): The maximum price
+        sort (str): The field to sort by (see `get_sort_key`)
+        top (int): Number of items to return (default: all)
+
+    Returns:
+        List[dict]: The selected items
+
+    Examples:
+        >>> items = [{'price': p} for p in (5, 0, 30, 12, 8)]
+        >>> [i['price'] for i in select(items, min_price=6)]
+        [30, 12, 8]
+        >>> [i['price'] for i in select(items, max_price=10, sort='-price')]
+        [8, 5]
+        >>> [i['price'] for i in select(items, sort='price', top=2)]
+        [5, 8]
+    """
+    if min_price is not None or max_price is not None:
+        low = float('-inf') if min_price is None else min_price
+        high = float('inf') if max_price is None else max_price
+
+        # items without a price (0) never match a price range
+        items = (
+            item for item in items
+            if item.get('price') and low <= item['price'] <= high)
+
+    if sort and top is not None:
+        selected = nsmallest(top, items, key=get_sort_key(sort))
+    elif sort:
+        selected = sorted(items, key=get_sort_key(sort))
+    else:
+        selected = list(islice(items, top))
+
+    return selected
+
 
 class Amazon(AmazonAPI):
     """An Amazon search"""
@@ -25,6 +403,18 @@ class Amazon(AmazonAPI):
         region : string
             one of  ['US', 'UK', 'FR', 'DE', 'IT', 'ES', 'CA', 'JP']
 
+        cache : object
+            A cache of raw API responses, with `get(url)` and
+            `set(url, response)` methods (see bottlenose `CacheReader` and
+            `CacheWriter` docs)
+
+        breaker : object
+            A :class:`app.breaker.CircuitBreaker` that all requests go through
+
+        hedge : float
+            Percentile of the region's recent response times after which a
+            second (hedged) request is sent (default: don't hedge)
+
         Keyword Arguments
         -----------------
         see bottlenose docs
@@ -44,12 +434,255 @@ class Amazon(AmazonAPI):
         key = kwargs.pop('key', getenv('AWS_ACCESS_KEY_ID'))
         secret = kwargs.pop('secret', getenv('AWS_SECRET_ACCESS_KEY'))
         tag = kwargs.pop('tag', getenv(_tag.format(region), 'na'))
+        cache = kwargs.pop('cache', None)
+        self.breaker = kwargs.pop('breaker', None)
+        self.hedge = kwargs.pop('hedge', None)
+
+        # Set when a deadline cut a `fetch_n` or `lookup_n` call short
+        self.partial = False
 
         if not (key and secret and tag):
             raise SystemExit('Error getting Amazon credentials.')
 
         super(Amazon, self).__init__(key, secret, tag, region)
 
+        # Cached responses are read in `_query` so that they neither count
+        # towards the region's response times nor go through the breaker
+        self.cache = cache
+
+        if cache:
+            self.api.CacheWriter = cache.set
+
+    def _call(self, api_call, deadline=None, **kwargs):
+        call = partial(api_call, **kwargs)
+        tracker = get_tracker(self.region)
+        delay = tracker.percentile(self.hedge) if self.hedge else None
+
+        if deadline is not None:
+            # bottlenose passes `Timeout` on to each `urlopen` call
+            api_call.Timeout = max(deadline - monotonic(), 0.001)
+
+        start = monotonic()
+
+        try:
+            response = hedge(call, delay) if delay else call()
+        except UPSTREAM_ERRORS:
+            # Our own deadline isn't a sign of an unhealthy region
+            if deadline is not None and monotonic() >= deadline:
+                raise DeadlineExceeded('Deadline exceeded')
+            else:
+                raise
+
+        tracker.add(monotonic() - start)
+        return response
+
+    def _query(self, operation, deadline=None, **kwargs):
+        api_call = getattr(self.api, operation)
+        url = api_call.cache_url(**kwargs) if self.cache else None
+        response = self.cache.get(url) if url else None
+        call = partial(self._call, api_call, deadline)
+        expired = deadline is not None and deadline <= monotonic()
+
+        if response is None and expired:
+            raise DeadlineExceeded('Deadline exceeded')
+        elif response is None and self.breaker:
+            response = self.breaker.call(call, **kwargs)
+        elif response is None:
+            response = call(**kwargs)
+
+        root = etree.fromstring(response)
+        check_errors(root, operation)
+        return root
+
+    def _lookup(self, asins, fields=None, **kwargs):
+        kwargs.setdefault('ResponseGroup', get_response_group(fields))
+
+        try:
+            root = self._query('ItemLookup', ItemId=','.join(asins), **kwargs)
+        except DeadlineExceeded:
+            self.partial = True
+            return []
+
+        return list(self.extract([root], fields))
+
+    def lookup_n(
+            self, asins, workers=None, fields=None, timeout=None, **kwargs):
+        """
+        Look up items by ASIN.
+
+        The ASINs are split into ItemLookup requests of up to 10 ASINs each,
+        and the requests are made concurrently.
+
+        Parameters
+        ----------
+        asins : List[str]
+            The ASINs to look up
+        workers : int
+            Size of the (shared) pool that makes the requests concurrently, or
+            1 to make them one by one (default: `LOOKUP_WORKERS`)
+        fields : List[str]
+            The fields to extract (default: all). The smallest response group
+            that includes them is requested.
+        timeout : float
+            Seconds until the lookup's deadline (default: no deadline). The
+            requests that haven't finished by then are skipped and `partial`
+            is set.
+
+        Keyword Arguments
+        -----------------
+        see ItemLookup docs
+
+        Returns
+        -------
+        Found items (unknown ASINs are skipped) : List[dict]
+
+        Examples
+        --------
+        >>> amazon = Amazon(region='UK')
+        >>> kwargs = {
+        ...     'SearchIndex': 'All', 'Keywords': 'Harry Potter',
+        ...     'ResponseGroup': 'Medium'}
+        >>> asins = [r.asin for r in amazon.search_n(12, **kwargs)]
+        >>> found = amazon.lookup_n(asins)
+        >>> sorted(r['asin'] for r in found) == sorted(asins)
+        True
+        """
+        step = MAX_LOOKUP_IDS
+        chunks = [asins[i:i + step] for i in range(0, len(asins), step)]
+
+        deadline = get_deadline(timeout)
+        lookup = partial(
+            self._lookup, fields=fields, deadline=deadline, **kwargs)
+
+        if len(chunks) > 1 and workers != 1:
+            results = get_pool(workers or LOOKUP_WORKERS).map(lookup, chunks)
+        else:
+            results = list(map(lookup, chunks))
+
+        return list(chain.from_iterable(results))
+
+    def search_pages(self, **kwargs):
+        """
+        Iterate over the raw pages of an Amazon search.
+
+        Keyword Arguments
+        -----------------
+        deadline : float
+            The `monotonic` time by which each page must be fetched (default:
+            no deadline). `DeadlineExceeded` is raised once it has passed.
+
+        see ItemSearch docs
+
+        Returns
+        -------
+        Search result pages : Iterator[lxml.etree.Element]
+        """
+        kwargs.pop('region', None)
+        kwargs.setdefault('ResponseGroup', 'Large')
+        page, total = 1, None
+
+        try:
+            while total is None or page <= total:
+                root = self._query('ItemSearch', ItemPage=page, **kwargs)
+                xpaths = get_xpaths(get_namespace(root))
+                total = int(get_field(xpaths, root, 'total_pages') or 0)
+                yield root
+                page += 1
+        except NoMorePages:
+            pass
+
+    def fetch_n(self, n, fields=None, timeout=None, progress=None, **kwargs):
+        """
+        Search and return the first n items in the format of `Amazon.parse`.
+
+        This is the equivalent of `parse(search_n(n, **kwargs))` but extracts
+        the items directly from the response XML.
+
+        Parameters
+        ----------
+        n : int
+            Number of results to return
+        fields : List[str]
+            The fields to extract (default: all). The smallest response group
+            that includes them is requested unless `ResponseGroup` is given.
+        timeout : float
+            Seconds until the search's deadline (default: no deadline). The
+            items fetched by then are returned and `partial` is set.
+        progress : func
+            Called with the items fetched so far after each page
+            (default: None)
+
+        Keyword Arguments
+        -----------------
+        see ItemSearch docs
+
+        Returns
+        -------
+        Cleaned up search results : List[dict]
+        """
+        kwargs.setdefault('ResponseGroup', get_response_group(fields))
+        deadline = get_deadline(timeout)
+        pages = self.search_pages(deadline=deadline, **kwargs)
+        items = []
+
+        try:
+            for page in pages:
+                extracted = self.extract([page], fields)
+                items.extend(islice(extracted, n - len(items)))
+
+                if progress:
+                    progress(items)
+
+                if len(items) >= n:
+                    break
+        except DeadlineExceeded:
+            self.partial = True
+
+        return items
+
+    def extract(self, pages, fields=None):
+        """
+        Extract items from raw Amazon API response pages.
+
+        The fields are read with precompiled XPath expressions in a single
+        pass over each page. The results are identical to `Amazon.parse`.
+
+        Parameters
+        ----------
+        pages : Iterable[lxml.etree.Element]
+            ItemSearch or ItemLookup response roots
+        fields : List[str]
+            The fields to extract (default: all). `asin` and `country` are
+            always included.
+
+        Returns
+        -------
+        Cleaned up search results : Iterator[dict]
+        """
+        fields = set(fields or FIELD_GROUPS)
+        domain = DOMAINS[self.region]
+        url = AMAZON_ASSOCIATES_BASE_URL.format(domain=domain) + '{}/?tag={}'
+        texts = fields.intersection(['model', 'title', 'sales_rank'])
+        priced = fields.intersection(['price', 'currency'])
+
+        for root in pages:
+            xpaths = get_xpaths(get_namespace(root))
+
+            for item in xpaths['items'](root):
+                get = partial(get_field, xpaths, item)
+                record = dict((field, get(field)) for field in texts)
+                record.update(asin=get('asin'), country=self.region)
+
+                if 'url' in fields:
+                    tag = self.aws_associate_tag
+                    record['url'] = url.format(record['asin'], tag)
+
+                if priced:
+                    price, currency = get_price(get, self.region)
+                    record.update(price=price or 0, currency=currency)
+
+                yield record
+
     def parse(self, response):
         """
         Convert Amazon API search response into a more readable format.
@@ -79,13 +712,18 @@ class Amazon(AmazonAPI):
         True
         """
         for r in response:
+            def get(field):
+                return r._safe_get_element_text(ITEM_PATHS[field])
+
+            price, currency = get_price(get, self.region)
+
             yield {
                 'asin': r.asin,
                 'model': r.model,
                 'url': r.offer_url,
                 'title': r.title,
-                'price': (r.price_and_currency[0] or 0),
+                'price': price or 0,
                 'country': self.region,
-                'currency': r.price_and_currency[1],
+                'currency': currency,
                 'sales_rank': r._safe_get_element_text('SalesRank'),
             }
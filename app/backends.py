@@ -0,0 +1,943 @@
+# -*- coding: utf-8 -*-
+"""
+    app.backends
+    ~~~~~~~~~~~~
+
+    Provides custom Flask-Caching backends. Set `CACHE_TYPE` to the dotted
+    path of a backend function, e.g., 'app.backends.pooled_memcached'.
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import mmap
+import sqlite3
+
+from os import getpid, path as p
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from hashlib import sha1
+from struct import Struct
+from tempfile import gettempdir
+from threading import Lock, local
+from time import time
+from uuid import uuid4
+from zlib import compress, decompress
+
+try:
+    from cPickle import dumps, loads, HIGHEST_PROTOCOL
+except ImportError:
+    from pickle import dumps, loads, HIGHEST_PROTOCOL
+
+try:
+    from fcntl import flock, LOCK_EX, LOCK_UN
+except ImportError:
+    # Without `flock` (e.g., on Windows) only threads are kept in sync
+    LOCK_EX = LOCK_UN = None
+
+    def flock(f, operation):
+        pass
+
+from werkzeug.contrib.cache import BaseCache, MemcachedCache
+from werkzeug.utils import import_string
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+# memcached rejects items over 1 MB (including the key and item overhead)
+MAX_ITEM_SIZE = 1000 * 1024
+
+# Shared memory cache slot data sizes (memcached calls these slab classes)
+SLOT_SIZES = (1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, MAX_ITEM_SIZE)
+SHM_MAGIC = b'AMZNSHM1'
+
+# (magic, file size, LRU clock)
+SHM_HEADER = Struct('<8sQQ')
+
+# (key digest, expiration time, last used clock, data length)
+SLOT_HEADER = Struct('<20sdQI')
+HASH_START = Struct('<Q')
+EMPTY_DIGEST = bytes(20)
+EMPTY_SLOT = bytes(SLOT_HEADER.size)
+
+# Number of least recently used disk cache rows read per eviction step
+EVICT_BATCH = 100
+
+DISK_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, '
+    'compressed INTEGER, expires REAL, used REAL, size INTEGER) WITHOUT ROWID')
+
+DISK_INDEX = 'CREATE INDEX IF NOT EXISTS cache_used ON cache (used)'
+DISK_SELECT = 'SELECT value, compressed, expires, used FROM cache WHERE key = ?'
+DISK_SET = 'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)'
+DISK_ADD = DISK_SET.replace('REPLACE', 'IGNORE')
+DISK_TOUCH = 'UPDATE cache SET used = ? WHERE key = ?'
+DISK_DELETE = 'DELETE FROM cache WHERE key = ?'
+DISK_EXPIRE = 'DELETE FROM cache WHERE expires > 0 AND expires <= ?'
+DISK_EXPIRE_KEY = DISK_DELETE + ' AND expires > 0 AND expires <= ?'
+DISK_OLDEST = 'SELECT key, size FROM cache ORDER BY used LIMIT ?'
+DISK_SIZE = 'SELECT SUM(size) FROM cache'
+DISK_ROW_SIZE = 'SELECT size FROM cache WHERE key = ?'
+
+Compressed = namedtuple('Compressed', ['data'])
+Chunks = namedtuple('Chunks', ['count', 'version'])
+SlotClass = namedtuple('SlotClass', ['offset', 'size', 'data_size', 'count'])
+
+
+def get_digest(key):
+    return sha1(key.encode('utf-8')).digest()
+
+
+class PooledClient(object):
+    """ Routes memcache client calls through a pool of clients
+
+    Each call reserves a client (waiting if all of them are in use), so
+    threads (or greenlets) neither share a connection nor open new ones. The
+    pool is recreated after a fork, so workers never share the sockets of
+    their parent.
+
+    Args:
+        make_client (func): Creates a pylibmc client
+        size (int): Number of clients in the pool
+    """
+    def __init__(self, make_client, size=8):
+        self.make_client = make_client
+        self.size = size
+        self.pid = None
+        self.pool = None
+        self.lock = Lock()
+
+    def get_pool(self):
+        if self.pid != getpid():
+            with self.lock:
+                if self.pid != getpid():
+                    # pylibmc is only installed in production
+                    import pylibmc
+
+                    client = self.make_client()
+                    self.pool = pylibmc.ClientPool(client, self.size)
+                    self.pid = getpid()
+
+        return self.pool
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            with self.get_pool().reserve(block=True) as client:
+                return getattr(client, name)(*args, **kwargs)
+
+        return call
+
+
+class ChunkedCache(BaseCache):
+    """ Stores values that are too big for a cache in compressed chunks
+
+    Values that pickle to more than `threshold` bytes are compressed. If
+    they are still bigger than `chunk_size`, they are split into chunks that
+    are stored under their own keys and read back with a single multi-get.
+    The stats count the oversize values, the chunked values, the chunks
+    written, and the reads that found a chunk missing (which are cache
+    misses).
+
+    Args:
+        cache (obj): The cache to store values in
+        threshold (int): Size (in bytes) above which values are compressed
+        chunk_size (int): Max size (in bytes) of a stored value
+        level (int): The compression level (default: 6)
+
+    Examples:
+        >>> from werkzeug.contrib.cache import SimpleCache
+        >>> cache = ChunkedCache(SimpleCache(), threshold=64, chunk_size=64)
+        >>> value = [str(i) for i in range(1000)]
+        >>> cache.set('key', value)
+        True
+        >>> cache.get('key') == value
+        True
+        >>> cache.stats['chunked'], cache.stats['chunks'] > 1
+        (1, True)
+        >>> cache.set('small', 'value')
+        True
+        >>> cache.get_many('small', 'key', 'missing')[0] == 'value'
+        True
+        >>> stored = len(cache.cache._cache)
+        >>> cache.add('key', value[::-1])
+        False
+        >>> len(cache.cache._cache) == stored, cache.get('key') == value
+        (True, True)
+    """
+    def __init__(self, cache, threshold=64 * 1024, chunk_size=MAX_ITEM_SIZE,
+                 level=6):
+        BaseCache.__init__(self, cache.default_timeout)
+        self.cache = cache
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.level = level
+        self.stats = Counter()
+        self.lock = Lock()
+
+    def count(self, **kwargs):
+        with self.lock:
+            self.stats.update(kwargs)
+
+    def get_chunk_keys(self, key, chunks):
+        key_format = '{}:chunk:{}:{{}}'.format(key, chunks.version)
+        return [key_format.format(pos) for pos in range(chunks.count)]
+
+    def pack(self, key, value):
+        data = dumps(value, HIGHEST_PROTOCOL)
+
+        if len(data) <= self.threshold:
+            return {key: value}
+
+        data = compress(data, self.level)
+        self.count(oversize=1)
+
+        if len(data) <= self.chunk_size:
+            return {key: Compressed(data)}
+
+        size = self.chunk_size
+        chunks = Chunks(-(-len(data) // size), uuid4().hex[:8])
+        parts = (data[pos:pos + size] for pos in range(0, len(data), size))
+        mapping = dict(zip(self.get_chunk_keys(key, chunks), parts))
+        self.count(chunked=1, chunks=chunks.count)
+
+        # The caller stores the chunks along with `key` (see `store`)
+        mapping[key] = chunks
+        return mapping
+
+    def unpack(self, key, value):
+        if isinstance(value, Chunks):
+            parts = list(self.cache.get_many(*self.get_chunk_keys(key, value)))
+
+            if None in parts:
+                self.count(chunk_misses=1)
+                return None
+
+            value = Compressed(b''.join(parts))
+
+        if isinstance(value, Compressed):
+            value = loads(decompress(value.data))
+
+        return value
+
+    def store(self, method, key, value, timeout=None):
+        mapping = self.pack(key, value)
+        value = mapping.pop(key)
+
+        # An `add` that loses to an existing key mustn't write its chunks.
+        # Until they are written, reads of `key` miss.
+        if mapping and method == 'add':
+            stored = self.cache.add(key, value, timeout=timeout)
+
+            if stored:
+                self.cache.set_many(mapping, timeout=timeout)
+        elif mapping:
+            self.cache.set_many(mapping, timeout=timeout)
+            stored = self.cache.set(key, value, timeout=timeout)
+        else:
+            stored = getattr(self.cache, method)(key, value, timeout=timeout)
+
+        return stored
+
+    def get(self, key):
+        return self.unpack(key, self.cache.get(key))
+
+    def get_many(self, *keys):
+        values = self.cache.get_many(*keys)
+        return [self.unpack(key, value) for key, value in zip(keys, values)]
+
+    def set(self, key, value, timeout=None):
+        return self.store('set', key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self.store('add', key, value, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        packed = {}
+
+        for key, value in mapping.items():
+            packed.update(self.pack(key, value))
+
+        return self.cache.set_many(packed, timeout=timeout)
+
+    # Chunks are left to expire along with the keys that point to them
+    def delete(self, key):
+        return self.cache.delete(key)
+
+    def delete_many(self, *keys):
+        return self.cache.delete_many(*keys)
+
+    def has(self, key):
+        return self.cache.has(key)
+
+    def clear(self):
+        return self.cache.clear()
+
+    def inc(self, key, delta=1):
+        return self.cache.inc(key, delta)
+
+    def dec(self, key, delta=1):
+        return self.cache.dec(key, delta)
+
+
+class SharedMemoryCache(BaseCache):
+    """ A cache in a memory-mapped file that all processes on a host share
+
+    The file is split into size classes (from 1 KB to 1 MB) of fixed-size
+    slots. Each key maps to a set of `ways` neighbouring slots in each class,
+    and a new value replaces an empty or expired slot, or else the least
+    recently used one of its set. So memory use is fixed and eviction is an
+    approximate LRU. Every operation holds an exclusive `flock` on the file
+    (and a thread lock), so it is safe across processes and threads.
+
+    Put the file on a memory-backed filesystem (e.g., /dev/shm) to avoid
+    disk writes. Values bigger than the largest slot aren't stored (wrap the
+    cache in `ChunkedCache` to store them in chunks).
+
+    Args:
+        path (str): The file path
+        size (int): The file size in bytes (default: 64 MB)
+        default_timeout (int): Default seconds to keep values for (default:
+            300)
+        ways (int): Number of slots a key can use in each class (default: 8)
+
+    Examples:
+        >>> from tempfile import NamedTemporaryFile
+        >>> f = NamedTemporaryFile()
+        >>> cache = SharedMemoryCache(f.name, size=2 * 1024 * 1024)
+        >>> cache.set('key', {'a': 1})
+        True
+        >>> SharedMemoryCache(f.name, size=2 * 1024 * 1024).get('key')
+        {'a': 1}
+        >>> cache.add('key', 'other')
+        False
+        >>> cache.set('big', 'x' * 5000) and cache.get('big') == 'x' * 5000
+        True
+        >>> cache.set('too big', 'x' * MAX_ITEM_SIZE)
+        False
+        >>> cache.inc('count'), cache.inc('count', 2)
+        (1, 3)
+        >>> cache.get_many('count', 'missing')
+        [3, None]
+        >>> cache.delete('key'), cache.get('key')
+        (True, None)
+        >>> cache.clear() and cache.get('big') is None
+        True
+    """
+    def __init__(self, path, size=64 * 1024 * 1024, default_timeout=300,
+                 ways=8):
+        BaseCache.__init__(self, default_timeout)
+        self.path = path
+        self.size = size
+        self.ways = ways
+        self.classes = self.get_classes(size)
+        self.pid = None
+        self.file = None
+        self.mmap = None
+        self.lock = Lock()
+
+        with self.locked():
+            pass
+
+    def get_classes(self, size):
+        # Splits the space after the header evenly between the size classes
+        space = (size - SHM_HEADER.size) // len(SLOT_SIZES)
+        offset, classes = SHM_HEADER.size, []
+
+        for data_size in SLOT_SIZES:
+            slot_size = SLOT_HEADER.size + data_size
+            count = space // slot_size
+
+            if count:
+                classes.append(SlotClass(offset, slot_size, data_size, count))
+                offset += slot_size * count
+
+        if not classes:
+            raise ValueError('Shared cache size {} is too small'.format(size))
+
+        return classes
+
+    def open(self):
+        # A lock is shared by the processes that share its file descriptor,
+        # so each process opens the file itself
+        if self.pid != getpid():
+            if self.file:
+                self.mmap.close()
+                self.file.close()
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self.file = os.fdopen(fd, 'r+b')
+            flock(self.file, LOCK_EX)
+
+            try:
+                if os.fstat(fd).st_size != self.size:
+                    self.file.truncate(self.size)
+
+                self.mmap = mmap.mmap(fd, self.size)
+                magic, size = SHM_HEADER.unpack_from(self.mmap)[:2]
+
+                if (magic, size) != (SHM_MAGIC, self.size):
+                    self.mmap[:] = bytes(self.size)
+                    SHM_HEADER.pack_into(self.mmap, 0, SHM_MAGIC, self.size, 0)
+            finally:
+                flock(self.file, LOCK_UN)
+
+            self.pid = getpid()
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            self.open()
+            flock(self.file, LOCK_EX)
+
+            try:
+                yield self.mmap
+            finally:
+                flock(self.file, LOCK_UN)
+
+    def tick(self):
+        clock = SHM_HEADER.unpack_from(self.mmap)[2] + 1
+        SHM_HEADER.pack_into(self.mmap, 0, SHM_MAGIC, self.size, clock)
+        return clock
+
+    def gen_slots(self, digest, classes=None):
+        start = HASH_START.unpack_from(digest)[0]
+
+        for slot_class in classes or self.classes:
+            ways = min(self.ways, slot_class.count)
+            first = start % slot_class.count
+
+            for way in range(ways):
+                pos = (first + way) % slot_class.count
+                yield slot_class, slot_class.offset + pos * slot_class.size
+
+    def find(self, digest):
+        for slot_class, offset in self.gen_slots(digest):
+            header = SLOT_HEADER.unpack_from(self.mmap, offset)
+
+            if header[0] == digest:
+                expires = header[1]
+
+                if expires and expires <= time():
+                    self.mmap[offset:offset + SLOT_HEADER.size] = EMPTY_SLOT
+                    return None
+
+                return offset, header
+
+    def load(self, digest):
+        found = self.find(digest)
+
+        if found:
+            offset, (_, expires, _, length) = found
+            SLOT_HEADER.pack_into(
+                self.mmap, offset, digest, expires, self.tick(), length)
+
+            start = offset + SLOT_HEADER.size
+            return loads(self.mmap[start:start + length])
+
+    def store(self, digest, value, timeout=None):
+        data = dumps(value, HIGHEST_PROTOCOL)
+        classes = [c for c in self.classes if c.data_size >= len(data)]
+
+        if not classes:
+            return False
+
+        found = self.find(digest)
+
+        if found:
+            offset = found[0]
+            self.mmap[offset:offset + SLOT_HEADER.size] = EMPTY_SLOT
+
+        now = time()
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = now + timeout if timeout > 0 else 0
+
+        def rank(slot):
+            header = SLOT_HEADER.unpack_from(self.mmap, slot[1])
+            free = header[0] == EMPTY_DIGEST or 0 < header[1] <= now
+            return (not free, header[2])
+
+        offset = min(self.gen_slots(digest, classes[:1]), key=rank)[1]
+        SLOT_HEADER.pack_into(
+            self.mmap, offset, digest, expires, self.tick(), len(data))
+
+        start = offset + SLOT_HEADER.size
+        self.mmap[start:start + len(data)] = data
+        return True
+
+    def get(self, key):
+        with self.locked():
+            return self.load(get_digest(key))
+
+    def get_many(self, *keys):
+        # One lock for all the keys, so e.g., a value's chunks are consistent
+        with self.locked():
+            return [self.load(get_digest(key)) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        with self.locked():
+            return self.store(get_digest(key), value, timeout)
+
+    def add(self, key, value, timeout=None):
+        digest = get_digest(key)
+
+        with self.locked():
+            if self.find(digest):
+                return False
+
+            return self.store(digest, value, timeout)
+
+    def delete(self, key):
+        with self.locked():
+            found = self.find(get_digest(key))
+
+            if found:
+                offset = found[0]
+                self.mmap[offset:offset + SLOT_HEADER.size] = EMPTY_SLOT
+
+            return bool(found)
+
+    def has(self, key):
+        with self.locked():
+            return bool(self.find(get_digest(key)))
+
+    def clear(self):
+        with self.locked():
+            for slot_class in self.classes:
+                for pos in range(slot_class.count):
+                    offset = slot_class.offset + pos * slot_class.size
+                    self.mmap[offset:offset + SLOT_HEADER.size] = EMPTY_SLOT
+
+            return True
+
+    def inc(self, key, delta=1):
+        digest = get_digest(key)
+
+        with self.locked():
+            value = (self.load(digest) or 0) + delta
+            return value if self.store(digest, value) else None
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+
+class SQLiteCache(BaseCache):
+    """ A cache in a SQLite database that survives restarts
+
+    Values are pickled, and compressed if they are bigger than `threshold`.
+    Once the stored values take up more than `max_size` bytes, the least
+    recently used ones are evicted (down to 90% of `max_size`). Nothing is
+    loaded on boot (reads go straight to the database), so a restarted
+    worker serves cached values immediately. The database is in WAL mode so
+    any number of processes can read it while one writes.
+
+    Args:
+        path (str): The database path
+        max_size (int): Max size (in bytes) of the stored values (default:
+            256 MB)
+        default_timeout (int): Default seconds to keep values for (default:
+            300)
+        threshold (int): Size (in bytes) above which values are compressed
+            (default: 1 KB)
+        level (int): The compression level (default: 6)
+
+    Examples:
+        >>> from tempfile import NamedTemporaryFile
+        >>> f = NamedTemporaryFile(suffix='.db')
+        >>> cache = SQLiteCache(f.name, max_size=20 * 1024, threshold=64)
+        >>> cache.set('key', {'a': 1})
+        True
+        >>> SQLiteCache(f.name).get('key')
+        {'a': 1}
+        >>> cache.add('key', 'other'), cache.get_with_ttl('key')[1] <= 300
+        (False, True)
+        >>> for pos in range(20):
+        ...     _ = cache.set(str(pos), os.urandom(2048))
+        >>> cache.get('0') is None, len(cache.get('19')), cache.size < 20 * 1024
+        (True, 2048, True)
+        >>> cache.set('big', 'x' * 10000)
+        True
+        >>> sql = 'SELECT size FROM cache WHERE key = ?'
+        >>> cache.connect().execute(sql, ('big',)).fetchone()[0] < 1000
+        True
+        >>> size = cache.size
+        >>> cache.set('big', 'y' * 10000) and cache.size == size
+        True
+        >>> cache.set_many({'a': 1, 'b': 2}) and cache.get('b')
+        2
+        >>> cache.inc('count'), cache.inc('count', 2)
+        (1, 3)
+        >>> cache.delete('19'), cache.get('19')
+        (True, None)
+        >>> cache.clear() and cache.get('big') is None
+        True
+    """
+    def __init__(self, path, max_size=256 * 1024 * 1024, default_timeout=300,
+                 threshold=1024, level=6):
+        BaseCache.__init__(self, default_timeout)
+        self.path = path
+        self.max_size = max_size
+        self.threshold = threshold
+        self.level = level
+        self.stats = Counter()
+        self.local = local()
+        self.lock = Lock()
+
+        with self.connect() as conn:
+            conn.execute(DISK_SCHEMA)
+            conn.execute(DISK_INDEX)
+
+        self.size = self.get_size()
+
+    def connect(self):
+        # sqlite connections can't be shared between threads or processes
+        conn = getattr(self.local, 'conn', None)
+
+        if getattr(self.local, 'pid', None) != getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn, self.local.pid = conn, getpid()
+
+        return conn
+
+    def get_size(self):
+        return self.connect().execute(DISK_SIZE).fetchone()[0] or 0
+
+    def get_expires(self, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        return time() + timeout if timeout > 0 else 0
+
+    def pack(self, value):
+        data = dumps(value, HIGHEST_PROTOCOL)
+
+        if len(data) > self.threshold:
+            return sqlite3.Binary(compress(data, self.level)), 1
+        else:
+            return sqlite3.Binary(data), 0
+
+    def unpack(self, data, compressed):
+        data = bytes(data)
+        return loads(decompress(data) if compressed else data)
+
+    def evict(self):
+        # Other processes write to the database too, so recount first
+        self.size = self.get_size()
+        target = self.max_size * 0.9
+
+        if self.size > self.max_size:
+            with self.connect() as conn:
+                conn.execute(DISK_EXPIRE, (time(),))
+                size = conn.execute(DISK_SIZE).fetchone()[0] or 0
+                evicted, rows = 0, True
+
+                # Reads the oldest rows a batch at a time, not the whole table
+                while rows and size > target:
+                    rows = conn.execute(DISK_OLDEST, (EVICT_BATCH,)).fetchall()
+                    keys = []
+
+                    for key, row_size in rows:
+                        if size <= target:
+                            break
+
+                        keys.append((key,))
+                        size -= row_size
+
+                    conn.executemany(DISK_DELETE, keys)
+                    evicted += len(keys)
+
+            self.size = size
+
+            with self.lock:
+                self.stats['evicted'] += evicted
+
+    def select(self, conn, key, now):
+        row = conn.execute(DISK_SELECT, (key,)).fetchone()
+        return row if row and not (row[2] and row[2] <= now) else None
+
+    def get_with_ttl(self, key):
+        """Gets a value and its remaining seconds to live (0 if it never
+        expires)"""
+        conn, now = self.connect(), time()
+        row = self.select(conn, key, now)
+
+        if not row:
+            return None, None
+
+        data, compressed, expires, used = row
+
+        # Only record reads once a minute to spare the writes
+        if now - used > 60:
+            with conn:
+                conn.execute(DISK_TOUCH, (now, key))
+
+        ttl = max(int(expires - now), 1) if expires else 0
+        return self.unpack(data, compressed), ttl
+
+    def get(self, key):
+        return self.get_with_ttl(key)[0]
+
+    def get_row_size(self, conn, key):
+        row = conn.execute(DISK_ROW_SIZE, (key,)).fetchone()
+        return row[0] if row else 0
+
+    def make_row(self, key, value, expires, now):
+        data, compressed = self.pack(value)
+        return (key, data, compressed, expires, now, len(data))
+
+    def grow(self, delta):
+        # A replaced row's size is subtracted, so the count doesn't drift
+        self.size += delta
+
+        if self.size > self.max_size:
+            self.evict()
+
+    def store(self, statement, key, value, timeout=None):
+        now = time()
+        row = self.make_row(key, value, self.get_expires(timeout), now)
+
+        with self.connect() as conn:
+            replaced = self.get_row_size(conn, key)
+
+            if statement == DISK_ADD:
+                # Expired values don't count
+                conn.execute(DISK_EXPIRE_KEY, (key, now))
+
+            added = conn.execute(statement, row).rowcount
+
+        self.grow(row[-1] - replaced if added else 0)
+        return bool(added)
+
+    def set(self, key, value, timeout=None):
+        return self.store(DISK_SET, key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self.store(DISK_ADD, key, value, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        # One transaction (and commit) for all the values
+        expires, now = self.get_expires(timeout), time()
+        rows = [self.make_row(k, v, expires, now) for k, v in mapping.items()]
+
+        with self.connect() as conn:
+            replaced = sum(self.get_row_size(conn, row[0]) for row in rows)
+            conn.executemany(DISK_SET, rows)
+
+        self.grow(sum(row[-1] for row in rows) - replaced)
+        return True
+
+    def delete(self, key):
+        with self.connect() as conn:
+            size = self.get_row_size(conn, key)
+            deleted = conn.execute(DISK_DELETE, (key,)).rowcount
+
+        self.size -= size if deleted else 0
+        return bool(deleted)
+
+    def has(self, key):
+        return bool(self.select(self.connect(), key, time()))
+
+    def clear(self):
+        with self.connect() as conn:
+            conn.execute('DELETE FROM cache')
+
+        self.size = 0
+        return True
+
+    def inc(self, key, delta=1):
+        conn = self.connect()
+
+        # Holds the write lock so other processes can't interleave
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time()
+            row = self.select(conn, key, now)
+            value = (self.unpack(*row[:2]) if row else 0) + delta
+            data, compressed = self.pack(value)
+            row = (key, data, compressed, self.get_expires(), now, len(data))
+            conn.execute(DISK_SET, row)
+
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+
+class TieredCache(BaseCache):
+    """ Reads through a fast cache to a persistent one
+
+    Writes go to both caches. A value missing from `front` is read from
+    `back` and copied to `front` for the rest of its time to live.
+
+    Args:
+        front (obj): The fast cache, e.g., memcached
+        back (obj): The persistent cache (a `SQLiteCache`)
+
+    Examples:
+        >>> from tempfile import NamedTemporaryFile
+        >>> from werkzeug.contrib.cache import SimpleCache
+        >>> f = NamedTemporaryFile(suffix='.db')
+        >>> cache = TieredCache(SimpleCache(), SQLiteCache(f.name))
+        >>> cache.set('key', 'value')
+        True
+        >>> cache = TieredCache(SimpleCache(), SQLiteCache(f.name))
+        >>> cache.get('key'), cache.front.get('key'), cache.stats['disk_hits']
+        ('value', 'value', 1)
+    """
+    def __init__(self, front, back):
+        BaseCache.__init__(self, back.default_timeout)
+        self.front = front
+        self.back = back
+        self.lock = Lock()
+        self.counts = Counter()
+
+    @property
+    def stats(self):
+        stats = Counter(getattr(self.front, 'stats', {}))
+        stats.update(self.back.stats)
+        stats.update(self.counts)
+        return stats
+
+    def get(self, key):
+        value = self.front.get(key)
+
+        if value is None:
+            value, ttl = self.back.get_with_ttl(key)
+
+            if value is not None:
+                self.front.set(key, value, timeout=ttl)
+
+                with self.lock:
+                    self.counts['disk_hits'] += 1
+
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.front.set(key, value, timeout=timeout)
+        return self.back.set(key, value, timeout=timeout)
+
+    def set_many(self, mapping, timeout=None):
+        self.front.set_many(mapping, timeout=timeout)
+        return self.back.set_many(mapping, timeout=timeout)
+
+    def add(self, key, value, timeout=None):
+        added = self.back.add(key, value, timeout=timeout)
+
+        if added:
+            self.front.set(key, value, timeout=timeout)
+
+        return added
+
+    def delete(self, key):
+        self.front.delete(key)
+        return self.back.delete(key)
+
+    def has(self, key):
+        return self.front.has(key) or self.back.has(key)
+
+    def clear(self):
+        self.front.clear()
+        return self.back.clear()
+
+    def inc(self, key, delta=1):
+        value = self.back.inc(key, delta)
+        self.front.set(key, value)
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+
+def pooled_memcached(app, config, args, kwargs):
+    """ Creates a memcached cache backed by a pool of pylibmc clients
+
+    Reads the following config settings: `CACHE_MEMCACHED_SERVERS`,
+    `CACHE_MEMCACHED_USERNAME` and `CACHE_MEMCACHED_PASSWORD` (SASL, implies
+    the binary protocol), `CACHE_KEY_PREFIX`, `MEMCACHE_POOL_SIZE`,
+    `MEMCACHE_BINARY`, `MEMCACHE_CONNECT_TIMEOUT` (ms), `MEMCACHE_TIMEOUT`
+    (ms, for each send and receive), and `CACHE_COMPRESS_THRESHOLD` (see
+    `ChunkedCache`).
+    """
+    hosts = ','.join(filter(None, config['CACHE_MEMCACHED_SERVERS'] or []))
+    servers = hosts.split(',') if hosts else ['127.0.0.1:11211']
+    username = config.get('CACHE_MEMCACHED_USERNAME')
+    password = config.get('CACHE_MEMCACHED_PASSWORD')
+    timeout = config.get('MEMCACHE_TIMEOUT', 1000)
+
+    behaviors = {
+        'tcp_nodelay': True,
+        'ketama': True,
+        'connect_timeout': config.get('MEMCACHE_CONNECT_TIMEOUT', 1000),
+        'send_timeout': timeout * 1000,
+        'receive_timeout': timeout * 1000}
+
+    options = {
+        'binary': bool(username) or config.get('MEMCACHE_BINARY', True),
+        'behaviors': behaviors}
+
+    if username:
+        options.update(username=username, password=password)
+
+    def make_client():
+        import pylibmc
+        return pylibmc.Client(servers, **options)
+
+    client = PooledClient(make_client, config.get('MEMCACHE_POOL_SIZE', 8))
+    args.append(client)
+    kwargs.update(key_prefix=config['CACHE_KEY_PREFIX'])
+    threshold = config.get('CACHE_COMPRESS_THRESHOLD', 64 * 1024)
+    cache = MemcachedCache(*args, **kwargs)
+    return ChunkedCache(cache, threshold, MAX_ITEM_SIZE)
+
+
+def shared_memory(app, config, args, kwargs):
+    """ Creates a cache in a memory-mapped file shared by all the processes
+    on the host
+
+    Reads the following config settings: `SHARED_CACHE_PATH` (default:
+    /dev/shm/<APP_NAME>.cache), `SHARED_CACHE_SIZE`, `CACHE_DEFAULT_TIMEOUT`,
+    and `CACHE_COMPRESS_THRESHOLD` (see `ChunkedCache`).
+
+    Examples:
+        >>> from os import urandom
+        >>> from tempfile import NamedTemporaryFile
+        >>> from flask import Flask
+        >>> f = NamedTemporaryFile()
+        >>> config = {'SHARED_CACHE_PATH': f.name, 'SHARED_CACHE_SIZE': 2 ** 22}
+        >>> cache = shared_memory(Flask(__name__), config, [], {})
+        >>> value = urandom(cache.chunk_size + 1)  # bigger than any slot
+        >>> cache.set('key', value) and cache.get('key') == value
+        True
+        >>> cache.stats['chunks']
+        2
+    """
+    shm_dir = '/dev/shm' if p.isdir('/dev/shm') else gettempdir()
+    name = '{}.cache'.format(app.config.get('APP_NAME', 'app'))
+    path = config.get('SHARED_CACHE_PATH') or p.join(shm_dir, name)
+    size = config.get('SHARED_CACHE_SIZE', 64 * 1024 * 1024)
+    timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    cache = SharedMemoryCache(path, size, timeout)
+
+    # Leave room for the pickled chunk's overhead
+    chunk_size = cache.classes[-1].data_size - 64
+    threshold = config.get('CACHE_COMPRESS_THRESHOLD', 64 * 1024)
+    return ChunkedCache(cache, threshold, chunk_size)
+
+
+def disk(app, config, args, kwargs):
+    """ Creates a cache in a SQLite database, optionally behind a faster one
+
+    Reads the following config settings: `DISK_CACHE_PATH`,
+    `DISK_CACHE_SIZE`, `CACHE_DEFAULT_TIMEOUT`, and `DISK_CACHE_FRONT` (the
+    dotted path of a backend function, e.g.,
+    'app.backends.pooled_memcached', to put in front of the database).
+    """
+    path = config['DISK_CACHE_PATH']
+    size = config.get('DISK_CACHE_SIZE', 256 * 1024 * 1024)
+    timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    cache = SQLiteCache(path, size, timeout)
+    front = config.get('DISK_CACHE_FRONT')
+
+    if front:
+        front = import_string(front)(app, config, list(args), dict(kwargs))
+        cache = TieredCache(front, cache)
+
+    return cache
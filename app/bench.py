@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    app.bench
+    ~~~~~~~~~
+
+    Provides benchmarks
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from timeit import Timer, default_timer
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+from inspect import getdoc, getmembers, isfunction
+
+from lxml import etree, objectify
+from amazon.api import AmazonProduct
+
+from app import views
+from app.api import Amazon
+from app.doc_parser import _DOCS, parse_doc, parse_docblock, gen_fields
+from app.offline import make_pages
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+
+def time_it(func, repeat=3):
+    return min(Timer(func).repeat(repeat=repeat, number=1))
+
+
+def bench_parse(count=1000, repeat=3, region='US'):
+    """Compares `Amazon.parse` with `Amazon.extract`
+
+    Both include parsing the response XML.
+
+    Args:
+        count (int): Number of items to parse (default: 1000)
+        repeat (int): Number of runs (the fastest is reported, default: 3)
+        region (str): The localized Amazon site (default: 'US')
+
+    Returns:
+        dict: The timings (in seconds) of each method
+
+    Examples:
+        >>> result = bench_parse(20, 1)
+        >>> sorted(result) == ['count', 'extract', 'parse']
+        True
+        >>> bench_parse(20, 1, 'JP')['count']
+        20
+    """
+    amazon = Amazon(key='key', secret='secret', tag='tag', region=region)
+    pages = make_pages(count, region=region)
+    tag = amazon.aws_associate_tag
+
+    def gen_products(page):
+        for item in objectify.fromstring(page).Items.Item:
+            yield AmazonProduct(item, tag, amazon.api, region=region)
+
+    def parse():
+        products = chain.from_iterable(map(gen_products, pages))
+        return list(amazon.parse(products))
+
+    def extract():
+        return list(amazon.extract(map(etree.fromstring, pages)))
+
+    if parse() != extract():
+        raise AssertionError('`extract` and `parse` results differ')
+
+    return {
+        'count': count,
+        'parse': time_it(parse, repeat),
+        'extract': time_it(extract, repeat)}
+
+
+def bench_docs(repeat=3):
+    """Compares parsing the view docstrings via XML with `parse_doc`
+
+    Args:
+        repeat (int): Number of runs (the fastest is reported, default: 3)
+
+    Returns:
+        dict: The timings (in seconds) of parsing all the docstrings via XML,
+            via `parse_doc`, and via memoized `parse_doc`
+    """
+    functions = getmembers(views, isfunction)
+    sources = [
+        getdoc(func) for _, func in functions
+        if func.__module__ == views.__name__ and getdoc(func)]
+
+    def xml():
+        for source in sources:
+            tree = parse_docblock(source)
+            list(gen_fields(tree))
+            next(tree.iter(tag='paragraph')).text
+
+    def direct():
+        _DOCS.clear()
+        memoized()
+
+    def memoized():
+        for source in sources:
+            parse_doc(source)
+
+    return {
+        'count': len(sources),
+        'xml': time_it(xml, repeat),
+        'direct': time_it(direct, repeat),
+        'memoized': time_it(memoized, repeat)}
+
+
+def bench_cache(backend, levels=(1, 4, 16), count=1000, size=1024):
+    """Measures cache hit latency and throughput at different concurrency
+    levels
+
+    Args:
+        backend (obj): The cache, e.g., `app.cache.cache`
+        levels (Iterable[int]): Numbers of concurrent workers (threads, or
+            greenlets when gevent has patched the thread module)
+        count (int): Number of cache hits per level (default: 1000)
+        size (int): Size of the cached value in bytes (default: 1024)
+
+    Returns:
+        List[dict]: The concurrency, throughput (hits per second), and median
+            and 99th percentile latency (in milliseconds) of each level
+
+    Examples:
+        >>> from werkzeug.contrib.cache import SimpleCache
+        >>> results = bench_cache(SimpleCache(), levels=(1, 2), count=20)
+        >>> [result['concurrency'] for result in results]
+        [1, 2]
+    """
+    key = 'bench:{}'.format(size)
+    backend.set(key, 'x' * size)
+
+    def hit(_):
+        start = default_timer()
+
+        if backend.get(key) is None:
+            raise AssertionError('Cache miss for {}'.format(key))
+
+        return default_timer() - start
+
+    results = []
+
+    for level in levels:
+        pool = ThreadPool(level)
+
+        try:
+            start = default_timer()
+            latencies = sorted(pool.map(hit, range(count)))
+            elapsed = default_timer() - start
+        finally:
+            pool.close()
+
+        results.append({
+            'concurrency': level,
+            'throughput': count / elapsed,
+            'median': latencies[count // 2] * 1000,
+            'p99': latencies[int(count * 0.99)] * 1000})
+
+    backend.delete(key)
+    return results
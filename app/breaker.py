@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+    app.breaker
+    ~~~~~~~~~~~
+
+    Provides upstream circuit breakers and hedged requests
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from collections import deque
+from threading import Lock, Thread
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+_BREAKERS = {}
+_TRACKERS = {}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """ Fails fast while an upstream service is unhealthy
+
+    After `threshold` consecutive failures the circuit opens, and calls raise
+    `CircuitOpen` without reaching the upstream service. Once `reset_timeout`
+    seconds have passed, a single trial call is let through. The circuit
+    closes if it succeeds and opens again if it fails.
+
+    Args:
+        threshold (int): Number of consecutive failures that open the circuit
+            (default: 5)
+        reset_timeout (int): Seconds to wait before a trial call (default: 30)
+        errors (Tuple[Exception]|func): The errors that count as failures
+            (default: all), or a function that determines if an error is a
+            failure. Other errors mean the service did respond.
+        neutral (Tuple[Exception]): The errors that count as neither a
+            failure nor a success, e.g., the caller giving up (default: none)
+
+    Examples:
+        >>> breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+        >>> breaker.call(int, '1')
+        1
+        >>> breaker.call(int, 'one')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid literal for int() with base 10: 'one'
+        >>> breaker.state == 'open'
+        True
+        >>> breaker.call(int, '1')  # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+        ...
+        CircuitOpen: Circuit is open
+        >>> breaker = CircuitBreaker(threshold=1, neutral=(ValueError,))
+        >>> breaker.call(int, 'one')
+        Traceback (most recent call last):
+        ...
+        ValueError: invalid literal for int() with base 10: 'one'
+        >>> breaker.state == 'closed'
+        True
+    """
+    def __init__(self, threshold=5, reset_timeout=30, errors=(Exception,),
+                 neutral=()):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.errors = errors
+        self.neutral = neutral
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            state = 'closed'
+        elif monotonic() - self.opened >= self.reset_timeout:
+            state = 'half-open'
+        else:
+            state = 'open'
+
+        return state
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            allowed = state == 'closed' or (
+                state == 'half-open' and not self.trial)
+
+            self.trial = self.trial or state == 'half-open'
+            return allowed
+
+    def succeed(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def fail(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+
+            if self.failures >= self.threshold:
+                self.opened = monotonic()
+
+    def is_failure(self, err):
+        if callable(self.errors):
+            failed = self.errors(err)
+        else:
+            failed = isinstance(err, self.errors)
+
+        return failed
+
+    def call(self, func, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen('Circuit is open')
+
+        try:
+            result = func(*args, **kwargs)
+        except self.neutral:
+            # Let another trial call through
+            with self.lock:
+                self.trial = False
+
+            raise
+        except Exception as err:
+            if self.is_failure(err):
+                self.fail()
+            else:
+                self.succeed()
+
+            raise
+
+        self.succeed()
+        return result
+
+
+class LatencyTracker(object):
+    """ Tracks the latency of recent calls
+
+    Args:
+        size (int): Number of calls to track (default: 100)
+        min_samples (int): Number of calls required before reporting a
+            percentile (default: 20)
+
+    Examples:
+        >>> tracker = LatencyTracker(min_samples=10)
+        >>> tracker.percentile(90) is None
+        True
+        >>> for seconds in range(1, 11):
+        ...     tracker.add(seconds)
+        >>> tracker.percentile(90)
+        10
+        >>> tracker.percentile(50)
+        6
+    """
+    def __init__(self, size=100, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self.lock = Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, percent):
+        with self.lock:
+            samples = sorted(self.samples)
+
+        if len(samples) >= self.min_samples:
+            index = int(len(samples) * percent / 100)
+            return samples[min(index, len(samples) - 1)]
+
+
+def get_breaker(name, threshold=5, reset_timeout=30, errors=(Exception,),
+                neutral=()):
+    """ Gets the (process wide) circuit breaker of an upstream service
+
+    Each service gets one breaker per `threshold` and `reset_timeout`, so
+    changing the settings takes effect.
+
+    Args:
+        name (str): The service name, e.g., an Amazon region
+
+    Returns:
+        (obj): The CircuitBreaker. See `CircuitBreaker` for the other args.
+
+    Examples:
+        >>> get_breaker('US') is get_breaker('US')
+        True
+        >>> get_breaker('US', 2).threshold
+        2
+    """
+    key = (name, threshold, reset_timeout)
+
+    if key not in _BREAKERS:
+        breaker = CircuitBreaker(threshold, reset_timeout, errors, neutral)
+        _BREAKERS.setdefault(key, breaker)
+
+    return _BREAKERS[key]
+
+
+def get_tracker(name):
+    """ Gets the (process wide) latency tracker of an upstream service
+
+    Args:
+        name (str): The service name, e.g., an Amazon region
+
+    Returns:
+        (obj): The LatencyTracker
+    """
+    if name not in _TRACKERS:
+        _TRACKERS.setdefault(name, LatencyTracker())
+
+    return _TRACKERS[name]
+
+
+def hedge(func, delay, *args, **kwargs):
+    """ Calls a function, and calls it again if the first call hasn't returned
+    after a delay
+
+    Whichever call returns first wins. An error is only raised if both calls
+    fail (or if the first call fails before the delay).
+
+    Args:
+        func (func): The function to call
+        delay (float): Seconds to wait before the second call
+        args (tuple): Positional arguments passed to `func`
+        kwargs (dict): Keyword arguments passed to `func`
+
+    Returns:
+        The result of `func`
+
+    Examples:
+        >>> from time import sleep
+        >>> calls = []
+        >>> def slow_once():
+        ...     calls.append(1)
+        ...     sleep(1 if len(calls) == 1 else 0)
+        ...     return len(calls)
+        >>> hedge(slow_once, 0.05)
+        2
+    """
+    results = Queue()
+
+    def run():
+        try:
+            results.put((True, func(*args, **kwargs)))
+        except Exception as err:
+            results.put((False, err))
+
+    def start():
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    start()
+
+    try:
+        ok, value = results.get(timeout=delay)
+    except Empty:
+        start()
+        ok, value = results.get()
+        ok, value = (ok, value) if ok else results.get()
+
+    if ok:
+        return value
+    else:
+        raise value
@@ -3,15 +3,24 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
-import pygogo as gogo
+from hashlib import sha1
 
+from docutils import nodes
 from docutils.core import publish_doctree
+from docutils.frontend import OptionParser
+from docutils.parsers.rst import Parser
+from docutils.utils import new_document
 from xml.etree.ElementTree import fromstring
 from sphinxcontrib.napoleon.docstring import GoogleDocstring
 
+from app.logs import get_logger
+
 from builtins import *  # noqa  # pylint: disable=unused-import
 
-logger = gogo.Gogo(__name__, monolog=True).logger
+logger = get_logger(__name__)
+
+_DOCS = {}
+_PARSER = {}
 
 
 class CustomDocstring(GoogleDocstring):
@@ -34,6 +43,38 @@ class CustomDocstring(GoogleDocstring):
         super(CustomDocstring, self).__init__(*args, **kwargs)
 
 
+def get_doctree(source, google_style=True):
+    if google_style:
+        source = str(CustomDocstring(source))
+
+    return publish_doctree(source)
+
+
+def parse_rst(source):
+    # Unlike `publish_doctree`, reuses the parser and its settings, and skips
+    # the document transforms (which don't touch paragraphs or fields that
+    # follow a docblock's summary)
+    if not _PARSER:
+        settings = OptionParser(components=(Parser,)).get_default_values()
+        _PARSER.update(parser=Parser(), settings=settings)
+
+    document = new_document('<docblock>', _PARSER['settings'])
+    _PARSER['parser'].parse(source, document)
+    return document
+
+
+def get_text(node):
+    # Same as `''.join(element.itertext())` on the XML of the node
+    return ''.join(text.astext() for text in node.traverse(nodes.Text))
+
+
+def get_summary(doctree):
+    # Same as `next(tree.iter(tag='paragraph')).text` on the XML of the tree
+    paragraph = next(iter(doctree.traverse(nodes.paragraph)), None)
+    first = paragraph[0] if paragraph is not None and len(paragraph) else None
+    return first.astext() if isinstance(first, nodes.Text) else None
+
+
 def parse_docblock(source, google_style=True):
     '''
     Args:
@@ -69,12 +110,7 @@ def parse_docblock(source, google_style=True):
         >>> next(tree.iter(tag='field'))  # doctest: +ELLIPSIS
         <Element 'field' at 0x...>
     '''
-    if google_style:
-        docstring = CustomDocstring(source)
-        doctree = publish_doctree(str(docstring))
-    else:
-        doctree = publish_doctree(source)
-
+    doctree = get_doctree(source, google_style)
     dom = doctree.asdom()
     xml = dom.toxml()
     # logger.debug(dom.toprettyxml(indent='  '))
@@ -158,12 +194,19 @@ def gen_fields(tree):
         ... 'kind': 'result'}
         True
     '''
+    pairs = (
+        (
+            next(field.iter(tag='field_name')).text,
+            ''.join(next(field.iter(tag='field_body')).itertext()))
+        for field in tree.iter(tag='field'))
+
+    return gen_columns(pairs)
+
+
+def gen_columns(pairs):
     prev_arg = None
 
-    for field in tree.iter(tag='field'):
-        name = next(field.iter(tag='field_name')).text
-        _body = next(field.iter(tag='field_body'))
-        body = ''.join(_body.itertext())
+    for name, body in pairs:
         kind, arg = name.split(' ') if ' ' in name else ('n/a', name.lower())
 
         if (kind in {'param', 'keyword'}) or (arg == 'returns'):
@@ -188,3 +231,48 @@ def gen_fields(tree):
             continue
 
         yield {'name': arg, 'desc': desc, 'type': arg_type, 'kind': kind}
+
+
+def parse_doc(source, google_style=True):
+    ''' Parses a docblock into its summary and fields
+
+    The same as `parse_docblock` followed by `gen_fields`, but walks the
+    docutils doctree directly (skipping its XML round trip and the document
+    transforms). The results are memoized by docblock hash.
+
+    Args:
+        source (str): docblock
+        google_style (bool): Google style docblocks
+
+    Returns:
+        dict: The `desc` (text of the first paragraph) and `columns` (see
+            `gen_fields`)
+
+    Examples:
+        >>> source = """One line summary.
+        ...
+        ... Args:
+        ...     arg1 (int): Description of `arg1`
+        ...
+        ... Returns:
+        ...     str: Description of return value.
+        ... """
+        >>> doc = parse_doc(source)
+        >>> doc['desc'] == 'One line summary.'
+        True
+        >>> doc['columns'] == list(gen_fields(parse_docblock(source)))
+        True
+    '''
+    text = '{}:{}'.format(google_style, source)
+    key = sha1(text.encode('utf-8')).hexdigest()
+
+    if key not in _DOCS:
+        rst = str(CustomDocstring(source)) if google_style else source
+        doctree = parse_rst(rst)
+        fields = doctree.traverse(nodes.field)
+        pairs = ((field[0].astext(), get_text(field[1])) for field in fields)
+        columns = tuple(gen_columns(pairs))
+        _DOCS[key] = {'desc': get_summary(doctree), 'columns': columns}
+
+    doc = _DOCS[key]
+    return {'desc': doc['desc'], 'columns': [dict(c) for c in doc['columns']]}
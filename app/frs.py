@@ -10,13 +10,35 @@ try:
 except ImportError:
     import urlparse
 
+from collections import namedtuple
+from copy import deepcopy
+from gzip import GzipFile
+from hashlib import sha1
+from io import BytesIO
 from operator import itemgetter
 
 import yaml
 
-from flask import jsonify, request, Blueprint
+from flask import make_response, request, Blueprint
 from builtins import *  # noqa  # pylint: disable=unused-import
 
+# Max number of hosts to keep a serialized document for
+MAX_HOSTS = 16
+
+SWAGGER = {
+    'swagger': '2.0',
+    'info': {},
+    'tags': [],
+    'schemes': ['https', 'http'],
+    'basePath': '/',
+    'consumes': ['application/json'],
+    'produces': ['application/json'],
+    'paths': {},
+    'definitions': {}
+}
+
+Document = namedtuple('Document', ['body', 'gzipped', 'etag'])
+
 SWAGGER_TYPES = {
     'bool': 'bool',
     'int': 'integer',
@@ -25,6 +47,7 @@ SWAGGER_TYPES = {
     'str': 'string',
     'date': 'date',
     'datetime': 'date-time',
+    'dict': 'object',
 }
 
 JSON_TYPES = {
@@ -47,21 +70,27 @@ def get_column_defn(column):
     return column_defn
 
 
-class Swaggerify(object):
-    swagger = {
-        'swagger': '2.0',
-        'info': {},
-        'tags': [],
-        'schemes': ['https', 'http'],
-        'basePath': '/',
-        'consumes': ['application/json'],
-        'produces': ['application/json'],
-        'paths': {},
-        'definitions': {}
-    }
+def gzip_bytes(content):
+    """ Compresses bytes with gzip
+
+    Examples:
+        >>> len(gzip_bytes(b'{}')) > 0
+        True
+    """
+    f = BytesIO()
 
+    # A fixed mtime keeps the output (and so its ETag) stable
+    with GzipFile(fileobj=f, mode='wb', mtime=0) as gzipped:
+        gzipped.write(content)
+
+    return f.getvalue()
+
+
+class Swaggerify(object):
     def __init__(self, app=None, **kwargs):
         self.app = None
+        self.swagger = deepcopy(SWAGGER)
+        self.documents = {}
 
         if app is not None:
             self.init_app(app, **kwargs)
@@ -82,6 +111,7 @@ class Swaggerify(object):
     @tags.setter
     def tags(self, value):
         self.swagger['tags'] = value
+        self.documents = {}
 
     @property
     def version(self):
@@ -93,6 +123,7 @@ class Swaggerify(object):
     @version.setter
     def version(self, value):
         self.swagger['info']['version'] = value
+        self.documents = {}
 
     @property
     def title(self):
@@ -104,6 +135,7 @@ class Swaggerify(object):
     @title.setter
     def title(self, value):
         self.swagger['info']['title'] = value
+        self.documents = {}
 
     @property
     def description(self):
@@ -115,6 +147,45 @@ class Swaggerify(object):
     @description.setter
     def description(self, value):
         self.swagger['info']['description'] = value
+        self.documents = {}
+
+    def get_document(self, host):
+        """ Gets the serialized document for a host
+
+        The document is built once per host, and never mutated afterwards.
+
+        Args:
+            host (str): The host (and port) the api is served from
+
+        Returns:
+            (obj): The Document, i.e., the JSON and gzipped JSON bytes, and
+                the ETag
+
+        Examples:
+            >>> swag = Swaggerify()
+            >>> doc = swag.get_document('localhost:5000')
+            >>> json.loads(doc.body.decode('utf-8'))['host'] == (
+            ...     'localhost:5000')
+            True
+            >>> swag.get_document('localhost:5000') is doc
+            True
+        """
+        # Rebinding (rather than mutating) `documents` keeps lookups from
+        # other threads consistent
+        documents = self.documents
+
+        if host not in documents:
+            spec = dict(self.swagger, host=host)
+            body = json.dumps(spec, sort_keys=True).encode('utf-8')
+            etag = sha1(body).hexdigest()
+            document = Document(body, gzip_bytes(body), etag)
+
+            documents = dict(documents) if len(documents) < MAX_HOSTS else {}
+            documents[host] = document
+            self.documents = documents
+            return document
+
+        return documents[host]
 
     def add_path(self, table, **kwargs):
         path = '{0}/{name}'.format(kwargs.get('url_prefix', ''), **table)
@@ -146,12 +217,14 @@ class Swaggerify(object):
         else:
             schema = {'$ref': ref}
 
-        self.swagger['paths'][path]['get'] = {
+        method = table.get('method', 'get')
+
+        self.swagger['paths'][path][method] = {
             'summary': table.get('desc', 'get {name}'.format(**table)),
             'tags': [table['tag']] if table.get('tag') else [],
             'parameters': parameters,
             'responses': {
-                200: {
+                table.get('status', 200): {
                     'description': '{name} result'.format(**table),
                     'schema': schema}}}
 
@@ -196,12 +269,26 @@ class Swaggerify(object):
         @swagger.route('/swagger.json')
         def swagger_json():
             # Must have a request context
-            self.swagger['host'] = urlparse.urlparse(request.url_root).netloc
-            return jsonify(self.swagger)
+            host = urlparse.urlparse(request.url_root).netloc
+            document = self.get_document(host)
+            encoding = request.headers.get('Accept-Encoding', '')
+
+            if 'gzip' in encoding.lower():
+                response = make_response(document.gzipped)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.set_etag('{}-gzip'.format(document.etag))
+            else:
+                response = make_response(document.body)
+                response.set_etag(document.etag)
+
+            response.mimetype = 'application/json'
+            response.vary.add('Accept-Encoding')
+            return response.make_conditional(request)
 
         app.register_blueprint(swagger)
 
     def create_docs(self, table, **kwargs):
+        self.documents = {}
         self.exclude_columns = set(kwargs.get('exclude_columns', []))
 
         if not kwargs.get('skip_defn'):
@@ -9,14 +9,43 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 from inspect import getdoc
-from app.doc_parser import gen_fields, parse_docblock
+from app.doc_parser import parse_doc
 from builtins import *  # noqa  # pylint: disable=unused-import
 
+ROUTE_TAGS = {
+    'search': 'Amazon', 'item': 'Amazon', 'history': 'History',
+    'summary': 'History', 'jobs': 'Jobs', 'job': 'Jobs',
+    'watch': 'Amazon', 'suggest': 'Amazon'}
 
-def gen_tables(view_functions, SWAGGER_EXCLUDE_ROUTES=None, **kwargs):
+ROUTE_STATUSES = {'jobs': 202}
+
+LIST_ROUTES = {'search', 'item', 'history', 'suggest'}
+
+
+def get_method(url_map, endpoint):
+    """ Gets the (lowercase) HTTP method an endpoint is documented under
+
+    Examples:
+        >>> from werkzeug.routing import Map, Rule
+        >>> url_map = Map([Rule('/jobs/', endpoint='jobs', methods=['POST'])])
+        >>> get_method(url_map, 'jobs') == 'post'
+        True
+        >>> get_method(None, 'search') == 'get'
+        True
+    """
+    rules = url_map.iter_rules(endpoint) if url_map else []
+    methods = set().union(*(rule.methods for rule in rules))
+    methods.difference_update({'HEAD', 'OPTIONS'})
+    return 'get' if 'GET' in methods or not methods else min(methods).lower()
+
+
+def gen_tables(
+        view_functions, SWAGGER_EXCLUDE_ROUTES=None, url_map=None, **kwargs):
     exclude_routes = SWAGGER_EXCLUDE_ROUTES or {}
 
-    for func_name, endpoint in view_functions.items():
+    for endpoint_name, endpoint in view_functions.items():
+        func_name = endpoint_name
+
         if func_name.startswith('blueprint'):
             func_name = '.'.join(func_name.split('.')[1:])
 
@@ -29,12 +58,14 @@ def gen_tables(view_functions, SWAGGER_EXCLUDE_ROUTES=None, **kwargs):
             source = getdoc(method)
 
             if source:
-                tree = parse_docblock(source)
+                doc = parse_doc(source)
 
                 yield {
-                    'columns': list(gen_fields(tree)),
+                    'columns': doc['columns'],
                     'name': func_name,
-                    'desc': next(tree.iter(tag='paragraph')).text,
-                    'tag': 'Amazon' if func_name == 'search' else 'Cache',
+                    'desc': doc['desc'],
+                    'tag': ROUTE_TAGS.get(func_name, 'Cache'),
                     'rtype': '{}_result'.format(func_name),
-                    'list': func_name == 'search'}
+                    'method': get_method(url_map, endpoint_name),
+                    'status': ROUTE_STATUSES.get(func_name, 200),
+                    'list': func_name in LIST_ROUTES}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+    app.history
+    ~~~~~~~~~~~
+
+    Provides an append-only price history store
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import sqlite3
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from os import getpid
+from time import time
+from threading import Thread, Lock
+
+import pygogo as gogo
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+logger = gogo.Gogo(__name__, monolog=True).logger
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS prices ('
+    'region TEXT, asin TEXT, utc INTEGER, price REAL, currency TEXT, '
+    'sales_rank INTEGER, PRIMARY KEY (region, asin, utc)) WITHOUT ROWID']
+
+INSERT = 'INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?)'
+SELECT = (
+    'SELECT utc, price, currency, sales_rank FROM prices '
+    'WHERE region = ? AND asin = ? AND utc >= ? AND utc <= ? ORDER BY utc')
+
+SUMMARIZE = (
+    'SELECT MIN(price), MAX(price), COUNT(*) FROM prices '
+    'WHERE region = ? AND asin = ? AND utc >= ? AND utc <= ?')
+
+LATEST = SELECT.replace('ORDER BY utc', 'ORDER BY utc DESC LIMIT 1')
+FIELDS = ('utc', 'price', 'currency', 'sales_rank')
+
+
+def to_record(item, utc):
+    rank = item.get('sales_rank')
+    rank = int(rank) if rank else None
+
+    return (
+        item['country'], item['asin'], utc, float(item['price']),
+        item.get('currency'), rank)
+
+
+class PriceHistory(object):
+    """An append-only price history store
+
+    Writes are queued and committed in batches by a background thread so they
+    never block the request.
+
+    Examples:
+        >>> from tempfile import NamedTemporaryFile
+        >>> f = NamedTemporaryFile(suffix='.db')
+        >>> history = PriceHistory(f.name, flush_interval=0)
+        >>> item = {
+        ...     'asin': 'B00005N5PF', 'country': 'US', 'currency': 'USD',
+        ...     'price': 9.99, 'sales_rank': '1999'}
+        >>> history.append([item], utc=1000)
+        >>> history.append([dict(item, price=7.99)], utc=2000)
+        >>> history.flush()
+        >>> [r['price'] for r in history.series('B00005N5PF')]
+        [9.99, 7.99]
+        >>> summary = history.summary('B00005N5PF', start=1500)
+        >>> summary['min'], summary['max'], summary['latest']['price']
+        (7.99, 7.99, 7.99)
+    """
+    def __init__(self, path=None, batch_size=500, flush_interval=5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue()
+        self.lock = Lock()
+        self.pid = None
+
+        if path:
+            self.create()
+
+    def init_app(self, app):
+        self.path = app.config['HISTORY_DB']
+        self.batch_size = app.config['HISTORY_BATCH_SIZE']
+        self.flush_interval = app.config['HISTORY_FLUSH_INTERVAL']
+        self.create()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self):
+        conn = self.connect()
+
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+        conn.close()
+
+    def start(self):
+        # The writer is started lazily (and restarted in forked workers) since
+        # threads don't survive a fork
+        with self.lock:
+            if self.pid != getpid():
+                self.queue = Queue()
+                writer = Thread(target=self.write)
+                writer.daemon = True
+                writer.start()
+                self.pid = getpid()
+
+    def write(self):
+        conn = self.connect()
+
+        while True:
+            batch = [self.queue.get()]
+            deadline = time() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    timeout = max(deadline - time(), 0)
+                    batch.append(self.queue.get(timeout=timeout))
+                except Empty:
+                    break
+
+            # A failed batch is dropped so the writer keeps running
+            try:
+                with conn:
+                    conn.executemany(INSERT, batch)
+            except Exception as err:
+                logger.error('Writing %s prices failed: %s', len(batch), err)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def append(self, items, utc=None):
+        """Queues priced items for writing
+
+        Args:
+            items (List[dict]): The parsed Amazon items
+            utc (int): The fetch timestamp (default: now)
+        """
+        if self.path:
+            self.start()
+            utc = int(time()) if utc is None else utc
+
+            for item in items:
+                if item.get('price') and item.get('asin'):
+                    self.queue.put(to_record(item, utc))
+
+    def flush(self):
+        """Blocks until all queued items are written"""
+        if self.pid == getpid():
+            self.queue.join()
+
+    def _query(self, query, asin, region='US', start=None, end=None):
+        start = 0 if start is None else start
+        end = int(time()) if end is None else end
+        conn = self.connect()
+
+        try:
+            return conn.execute(query, (region, asin, start, end)).fetchall()
+        finally:
+            conn.close()
+
+    def series(self, asin, region='US', start=None, end=None):
+        """The price time series of an item
+
+        Args:
+            asin (str): The item's ASIN
+            region (str): The localized Amazon site (default: 'US')
+            start (int): The window start timestamp (default: 0)
+            end (int): The window end timestamp (default: now)
+
+        Returns:
+            (List[dict]): The prices ordered by timestamp
+        """
+        rows = self._query(SELECT, asin, region, start, end)
+        return [dict(zip(FIELDS, row)) for row in rows]
+
+    def summary(self, asin, region='US', start=None, end=None):
+        """The minimum, maximum and latest price of an item over a window
+
+        Args:
+            asin (str): The item's ASIN
+            region (str): The localized Amazon site (default: 'US')
+            start (int): The window start timestamp (default: 0)
+            end (int): The window end timestamp (default: now)
+
+        Returns:
+            (dict): The price summary
+        """
+        args = (asin, region, start, end)
+        _min, _max, count = self._query(SUMMARIZE, *args)[0]
+        latest = self._query(LATEST, *args)
+
+        return {
+            'min': _min, 'max': _max, 'count': count,
+            'latest': dict(zip(FIELDS, latest[0])) if latest else None}
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+    app.jobs
+    ~~~~~~~~
+
+    Provides a background job queue whose state is kept in the cache
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from os import getpid
+from datetime import datetime as dt
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from uuid import uuid4
+
+import pygogo as gogo
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+logger = gogo.Gogo(__name__, monolog=True).logger
+
+
+class JobFailed(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue(object):
+    """Runs jobs in a pool of background threads
+
+    The job state (status, progress, and the final results) is stored in the
+    cache, so with a shared cache any worker process can report on a job.
+    Jobs run in an app context.
+
+    Args:
+        cache (obj): The cache to store the job state in
+        workers (int): Number of jobs to run at once (default: 2)
+        timeout (int): Seconds to keep the job state for (default: 3600)
+        max_pending (int): Number of unfinished jobs above which new ones are
+            refused (default: 100)
+
+    Examples:
+        >>> from flask import Flask
+        >>> from werkzeug.contrib.cache import SimpleCache
+        >>> jobs = JobQueue(SimpleCache())
+        >>> jobs.init_app(Flask(__name__))
+        >>> def count(n, progress):
+        ...     progress(n // 2)
+        ...     return list(range(n))
+        >>> job_id = jobs.submit(count, 4)
+        >>> jobs.wait(job_id)
+        >>> job = jobs.get(job_id)
+        >>> job['status'], job['progress'], job['objects']
+        ('done', 4, [0, 1, 2, 3])
+        >>> job_id = jobs.submit(count, None)
+        >>> jobs.wait(job_id)
+        >>> jobs.get(job_id)['status']
+        'failed'
+    """
+    def __init__(self, cache, workers=2, timeout=3600, max_pending=100):
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.app = None
+        self.pid = None
+        self.pool = None
+        self.results = {}
+        self.lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.timeout = app.config.get('JOB_TIMEOUT', self.timeout)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', self.max_pending)
+
+    def get_pool(self):
+        # Threads don't survive a fork so each worker process needs its own
+        if self.pid != getpid():
+            with self.lock:
+                if self.pid != getpid():
+                    self.pool = ThreadPool(self.workers)
+                    self.results = {}
+                    self.pid = getpid()
+
+        return self.pool
+
+    def make_key(self, job_id):
+        return 'job:{}'.format(job_id)
+
+    def get(self, job_id):
+        return self.cache.get(self.make_key(job_id))
+
+    def update(self, job_id, **kwargs):
+        job = self.get(job_id) or {'id': job_id}
+        job.update(kwargs, updated=dt.utcnow())
+        self.cache.set(self.make_key(job_id), job, timeout=self.timeout)
+        return job
+
+    # Only the count is stored, rewriting the results so far on every page
+    # would be quadratic
+    def progress(self, job_id, count):
+        self.update(job_id, progress=count)
+
+    def run(self, job_id, func, args, kwargs):
+        progress = partial(self.progress, job_id)
+
+        with self.app.app_context():
+            self.update(job_id, status='running')
+
+            try:
+                objects = func(*args, progress=progress, **kwargs)
+            except Exception as err:
+                logger.error('Job %s failed: %s', job_id, err)
+                self.update(job_id, status='failed', error=str(err))
+            else:
+                self.update(
+                    job_id, status='done', progress=len(objects),
+                    objects=objects)
+
+    def submit(self, func, *args, **kwargs):
+        """Queues a job
+
+        Args:
+            func (func): The job. It is passed a `progress` keyword argument,
+                a function that stores the number of results so far, and
+                returns the final results.
+            args (List): Positional arguments passed to `func`
+            kwargs (dict): Keyword arguments passed to `func`
+
+        Returns:
+            str: The job id
+
+        Raises:
+            QueueFull: If this process has `max_pending` unfinished jobs
+        """
+        pool = self.get_pool()
+
+        with self.lock:
+            self.results = dict(
+                (k, r) for k, r in self.results.items() if not r.ready())
+
+            if len(self.results) >= self.max_pending:
+                raise QueueFull('Too many background searches, try again later')
+
+        job_id = uuid4().hex
+        created = dt.utcnow()
+        self.update(
+            job_id, status='pending', progress=0, created=created,
+            error=None, objects=None)
+
+        args = (job_id, func, args, kwargs)
+        result = pool.apply_async(self.run, args)
+
+        with self.lock:
+            self.results[job_id] = result
+
+        return job_id
+
+    def wait(self, job_id, timeout=None):
+        """Waits for a job this process started to finish"""
+        result = self.results.get(job_id)
+
+        if result:
+            result.wait(timeout)
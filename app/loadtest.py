@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+    app.loadtest
+    ~~~~~~~~~~~~
+
+    Provides a load generator for the api
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from bisect import bisect
+from collections import Counter
+from itertools import product
+from random import Random
+from threading import Thread, local
+from timeit import default_timer
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+from app.utils import get_session
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+KEYWORDS = [
+    'lego', 'kindle', 'headphones', 'coffee', 'batteries', 'usb cable',
+    'monitor', 'keyboard', 'backpack', 'water bottle', 'blender', 'yoga mat',
+    'sunglasses', 'printer', 'camera', 'tent', 'guitar', 'drill', 'router',
+    'mouse', 'charger', 'speaker', 'watch', 'notebook', 'desk lamp']
+
+REGIONS = ['US', 'UK', 'DE', 'FR', 'JP', 'CA']
+
+
+def make_paths(keywords=None, regions=None, limit=10, seed=0):
+    """Creates the search paths to request (in popularity order)
+
+    Args:
+        keywords (List[str]): The search terms (default: `KEYWORDS`)
+        regions (List[str]): The localized Amazon sites (default: `REGIONS`)
+        limit (int): Number of results each search returns (default: 10)
+        seed (int): Seeds the order of the paths (default: 0)
+
+    Returns:
+        List[str]: The paths
+
+    Examples:
+        >>> paths = make_paths(['lego', 'kindle'], ['US', 'UK'])
+        >>> len(paths)
+        4
+        >>> sorted(paths)[0] == '/search/?q=kindle&region=UK&limit=10'
+        True
+    """
+    pairs = list(product(keywords or KEYWORDS, regions or REGIONS))
+    Random(seed).shuffle(pairs)
+    queries = ([('q', k), ('region', r), ('limit', limit)] for k, r in pairs)
+    return ['/search/?{}'.format(urlencode(query)) for query in queries]
+
+
+class ZipfSampler(object):
+    """Picks items with a Zipf distribution, i.e., the item at position `n`
+    is picked with a probability proportional to `1 / n ** skew`
+
+    Args:
+        items (List): The items, the most popular first
+        skew (float): The distribution exponent, higher values concentrate
+            the picks on fewer items (default: 1.1)
+
+    Examples:
+        >>> sampler = ZipfSampler(['a', 'b', 'c'], skew=2)
+        >>> random = Random(0)
+        >>> picks = Counter(sampler.sample(random) for _ in range(1000))
+        >>> picks['a'] > picks['b'] > picks['c']
+        True
+    """
+    def __init__(self, items, skew=1.1):
+        self.items = items
+        self.cumulative = []
+        total = 0
+
+        for rank in range(1, len(items) + 1):
+            total += 1 / rank ** skew
+            self.cumulative.append(total)
+
+    def sample(self, random):
+        point = random.random() * self.cumulative[-1]
+        return self.items[bisect(self.cumulative, point)]
+
+
+def percentile(values, pct):
+    """Gets the nearest-rank percentile of sorted values
+
+    Examples:
+        >>> percentile(list(range(1, 101)), 95)
+        95
+        >>> percentile([], 50)
+    """
+    if values:
+        rank = -(-len(values) * pct // 100)
+        return values[max(int(rank), 1) - 1]
+
+
+def summarize(samples, elapsed):
+    """Summarizes the samples of a load test
+
+    Args:
+        samples (List[tuple]): The status (`None` if the request failed),
+            latency (in seconds), and `X-Cache` header of each request
+        elapsed (float): The test duration (in seconds)
+
+    Returns:
+        dict: The number of requests, throughput (requests per second),
+            latency percentiles (in milliseconds), cache hit ratio, and
+            errors (by status) and error rate
+
+    Examples:
+        >>> samples = [(200, 0.1, 'HIT'), (200, 0.3, 'MISS'), (503, 0.2, '')]
+        >>> result = summarize(samples, 2)
+        >>> result['throughput'], result['hit_ratio'], result['errors']
+        (1.5, 0.5, {'503': 1})
+        >>> result['latency']['p50']
+        200.0
+    """
+    latencies = sorted(latency * 1000 for _, latency, _ in samples)
+    caches = Counter(cache for _, _, cache in samples if cache)
+    looked_up = caches['HIT'] + caches['MISS']
+    errors = Counter(
+        str(status or 'failed') for status, _, _ in samples
+        if not status or status >= 400)
+
+    count = len(samples)
+    mean = sum(latencies) / count if count else None
+    pcts = ((pct, percentile(latencies, pct)) for pct in (50, 95, 99))
+    latency = dict(('p{}'.format(pct), value) for pct, value in pcts)
+    latency.update(mean=mean, max=latencies[-1] if latencies else None)
+
+    return {
+        'requests': count,
+        'duration': elapsed,
+        'throughput': count / elapsed if elapsed else None,
+        'latency': latency,
+        'hit_ratio': caches['HIT'] / looked_up if looked_up else None,
+        'errors': dict(errors),
+        'error_rate': sum(errors.values()) / count if count else None}
+
+
+def format_summary(result):
+    """Formats the results of a load test for display
+
+    Values that can't be measured (e.g., when no request completed) are shown
+    as `n/a`.
+
+    Args:
+        result (dict): The results (see `summarize`)
+
+    Returns:
+        str: The formatted results
+
+    Examples:
+        >>> print(format_summary(summarize([], 1)))
+        0 requests in 1.0s: 0.0 req/s, error rate: n/a, hit ratio: n/a
+        latency (ms) p50: n/a, p95: n/a, p99: n/a, mean: n/a, max: n/a
+    """
+    def fmt(value, spec):
+        return 'n/a' if value is None else format(value, spec)
+
+    latency = result['latency']
+    stats = ['p50', 'p95', 'p99', 'mean', 'max']
+    msg = '{} requests in {:.1f}s: {} req/s, error rate: {}, hit ratio: {}\n'
+    msg += 'latency (ms) '
+    msg += ', '.join('{}: {{}}'.format(stat) for stat in stats)
+
+    return msg.format(
+        result['requests'], result['duration'],
+        fmt(result['throughput'], '.1f'), fmt(result['error_rate'], '.2%'),
+        fmt(result['hit_ratio'], '.2f'),
+        *(fmt(latency[stat], '.1f') for stat in stats))
+
+
+def run(get, paths, concurrency=8, duration=10, skew=1.1, seed=0):
+    """Requests paths from concurrent workers for a given duration
+
+    Args:
+        get (func): Requests a path and returns its status and `X-Cache`
+            header
+        paths (List[str]): The paths to request, the most popular first
+        concurrency (int): Number of workers (threads, or greenlets when
+            gevent has patched the thread module, default: 8)
+        duration (float): Seconds to run for (default: 10)
+        skew (float): The Zipf exponent of the path mix (default: 1.1)
+        seed (int): Seeds the path mix (default: 0)
+
+    Returns:
+        dict: The results (see `summarize`)
+
+    Examples:
+        >>> result = run(lambda path: (200, 'HIT'), ['/'], 2, 0.05)
+        >>> result['requests'] > 0, result['errors'], result['hit_ratio']
+        (True, {}, 1.0)
+    """
+    sampler = ZipfSampler(paths, skew)
+    samples = []
+    deadline = default_timer() + duration
+
+    def work(pos):
+        random = Random(seed + pos)
+        results = []
+
+        while default_timer() < deadline:
+            path = sampler.sample(random)
+            start = default_timer()
+
+            try:
+                status, cache = get(path)
+            except Exception:
+                status, cache = None, None
+
+            results.append((status, default_timer() - start, cache))
+
+        # `list.extend` is atomic
+        samples.extend(results)
+
+    start = default_timer()
+    workers = [Thread(target=work, args=(pos,)) for pos in range(concurrency)]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    return summarize(samples, default_timer() - start)
+
+
+def make_app_get(app):
+    """Creates a `get` function that requests paths from an app in-process
+
+    Each thread uses its own test client.
+    """
+    clients = local()
+
+    def get(path):
+        if not hasattr(clients, 'client'):
+            clients.client = app.test_client(use_cookies=False)
+
+        response = clients.client.get(path)
+
+        # Send the (possibly streamed) body and close it like a server would
+        response.get_data()
+        response.close()
+        return response.status_code, response.headers.get('X-Cache')
+
+    return get
+
+
+def make_http_get(base_url, timeout=30):
+    """Creates a `get` function that requests paths from a server over HTTP
+    (via a pooled session)
+    """
+    session = get_session()
+
+    def get(path):
+        response = session.get(base_url.rstrip('/') + path, timeout=timeout)
+        return response.status_code, response.headers.get('X-Cache')
+
+    return get
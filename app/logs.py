@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+    app.logs
+    ~~~~~~~~
+
+    Provides loggers that write from a background thread, and a sampled
+    structured search log
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+try:
+    from queue import Queue, Full
+except ImportError:
+    from Queue import Queue, Full
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    from logutils.queue import QueueHandler, QueueListener
+
+from os import getpid
+from random import random
+from threading import Lock
+
+import pygogo as gogo
+
+from flask import current_app as app, request
+
+from app.profiler import get_canonical_query
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+QUEUE_SIZE = 10000
+
+
+class AsyncHandler(QueueHandler):
+    """Queues records for a background thread to write with `handlers`
+
+    So a log call never waits on I/O. When the queue is full, records are
+    dropped (and counted) rather than blocking the caller.
+
+    Args:
+        handlers (List[obj]): The handlers that write the records
+        maxsize (int): Max number of queued records (default: 10000)
+
+    Examples:
+        >>> import logging
+        >>> from io import StringIO
+        >>> f = StringIO()
+        >>> handler = AsyncHandler([logging.StreamHandler(f)])
+        >>> logger = logging.getLogger('app.logs.example')
+        >>> logger.propagate = False
+        >>> logger.addHandler(handler)
+        >>> logger.warning('hello %s', 'world')
+        >>> handler.flush()
+        >>> f.getvalue() == 'hello world\\n'
+        True
+    """
+    def __init__(self, handlers, maxsize=QUEUE_SIZE):
+        QueueHandler.__init__(self, Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self.pid = None
+
+        # `self.lock` is the handler's own, and is held while emitting
+        self.start_lock = Lock()
+
+    def start(self):
+        # Threads don't survive a fork so each worker process needs its own
+        if self.pid != getpid():
+            with self.start_lock:
+                if self.pid != getpid():
+                    self.queue = Queue(self.maxsize)
+                    self.listener = QueueListener(
+                        self.queue, *self.handlers,
+                        respect_handler_level=True)
+
+                    self.listener.start()
+                    self.pid = getpid()
+
+    def enqueue(self, record):
+        self.start()
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            with self.start_lock:
+                self.dropped += 1
+
+    def flush(self):
+        """Blocks until the queued records are written"""
+        if self.pid == getpid():
+            self.queue.join()
+
+    def close(self):
+        # Writes the queued records (`logging` closes handlers at exit)
+        if self.listener and self.pid == getpid():
+            self.listener.stop()
+            self.listener = None
+
+        QueueHandler.close(self)
+
+
+def get_logger(name, **kwargs):
+    """Creates a pygogo logger whose records are written by a background
+    thread
+
+    Args:
+        name (str): The logger name
+        kwargs (dict): Keyword arguments passed to `pygogo.Gogo`
+
+    Returns:
+        (obj): The logger
+    """
+    logger = gogo.Gogo(name, monolog=True, **kwargs).logger
+    logger.handlers = [AsyncHandler(logger.handlers)]
+    return logger
+
+
+search_logger = get_logger(
+    __name__, low_formatter=gogo.formatters.structured_formatter)
+
+
+def sample(rate, status=200):
+    """Determines if a request should be logged
+
+    Errors are always logged, other requests with probability `rate`.
+
+    Examples:
+        >>> sample(0), sample(0, 503), sample(1)
+        (False, True, True)
+    """
+    return status >= 400 or random() < rate
+
+
+def gen_counted(chunks, counter):
+    for chunk in chunks:
+        counter['bytes'] += len(chunk)
+        yield chunk
+
+
+def log_search(response, **fields):
+    """Logs a structured record of a search once its response is sent
+
+    The record has the canonical query, status, and size (in bytes) of the
+    response, along with the given `fields`. Only a `SEARCH_LOG_RATE`
+    fraction of the successful searches are logged.
+
+    Args:
+        response (obj): The search response
+        fields (dict): Extra fields to log, e.g., the region, cache outcome,
+            upstream time, and result count
+
+    Returns:
+        (obj): The response
+    """
+    if sample(app.config.get('SEARCH_LOG_RATE', 1), response.status_code):
+        args = request.args.items(multi=True)
+        fields['query'] = get_canonical_query(request.path, args)
+        fields['status'] = response.status_code
+        counter = {'bytes': 0}
+
+        # Streamed responses (e.g., tables) are counted as they're sent
+        if response.is_streamed:
+            response.response = gen_counted(response.response, counter)
+
+        def write():
+            size = response.content_length
+            size = counter['bytes'] if size is None else size
+            search_logger.info('search', extra=dict(fields, bytes=size))
+
+        response.call_on_close(write)
+
+    return response
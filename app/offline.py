@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+    app.offline
+    ~~~~~~~~~~~
+
+    Provides canned Amazon API responses
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from random import Random
+from threading import Lock
+from time import sleep
+from xml.sax.saxutils import escape
+
+try:
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from urlparse import urlsplit, parse_qs
+
+from bottlenose.api import SERVICE_DOMAINS
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+NAMESPACE = 'http://webservices.amazon.com/AWSECommerceService/2013-08-01'
+ITEMS_PER_PAGE = 10
+
+RESPONSE = (
+    '<?xml version="1.0" ?><{operation}Response xmlns="{namespace}">'
+    '<Items><Request><IsValid>True</IsValid></Request>'
+    '<TotalResults>{total_results}</TotalResults>'
+    '<TotalPages>{total_pages}</TotalPages>{items}</Items>'
+    '</{operation}Response>')
+
+ITEM = (
+    '<Item><ASIN>{asin}</ASIN><SalesRank>{sales_rank}</SalesRank>'
+    '<ItemAttributes>{model}<Title>{title}</Title></ItemAttributes>'
+    '<OfferSummary><LowestNewPrice><Amount>{lowest}</Amount>'
+    '<CurrencyCode>{currency}</CurrencyCode></LowestNewPrice></OfferSummary>'
+    '{offers}</Item>')
+
+OFFER = (
+    '<Offers><Offer><OfferListing><{kind}><Amount>{amount}</Amount>'
+    '<CurrencyCode>{currency}</CurrencyCode></{kind}></OfferListing></Offer>'
+    '</Offers>')
+
+REGIONS = dict(
+    (domains[0], region) for region, domains in SERVICE_DOMAINS.items())
+
+CURRENCIES = {
+    'CA': 'CAD', 'DE': 'EUR', 'ES': 'EUR', 'FR': 'EUR', 'IT': 'EUR',
+    'JP': 'JPY', 'UK': 'GBP', 'US': 'USD'}
+
+
+def gen_items(count, start=0, keywords='item', region='US'):
+    """Generates fake Amazon items
+
+    The items are deterministic for a given set of arguments and cover the
+    different ways Amazon reports a price.
+
+    Args:
+        count (int): Number of items to generate
+        start (int): Index of the first item (default: 0)
+        keywords (str): Search term to include in the titles
+        region (str): The localized Amazon site (default: 'US')
+
+    Yields:
+        dict: item
+
+    Examples:
+        >>> item = next(gen_items(1, keywords='lego'))
+        >>> sorted(item.keys()) == [
+        ...     'asin', 'currency', 'kind', 'lowest', 'model', 'price',
+        ...     'sales_rank', 'title']
+        True
+        >>> 'lego' in item['title']
+        True
+    """
+    random = Random('{}:{}'.format(keywords, region))
+    currency = CURRENCIES.get(region, 'USD')
+    kinds = ['SalePrice', 'Price', None]
+
+    for pos in range(start, start + count):
+        lowest = random.randint(100, 100000)
+
+        yield {
+            'asin': 'B{:09d}'.format(random.randint(0, 10 ** 9 - 1)),
+            'title': '{} item #{}'.format(keywords, pos),
+            'model': 'M-{}'.format(pos) if pos % 3 else None,
+            'sales_rank': random.randint(1, 10 ** 6),
+            'lowest': lowest,
+            'price': lowest + random.randint(0, 1000),
+            'currency': currency,
+            'kind': kinds[pos % len(kinds)]}
+
+
+def make_item(item):
+    if item['kind']:
+        offers = OFFER.format(amount=item['price'], **item)
+    else:
+        offers = ''
+
+    model = '<Model>{}</Model>'.format(item['model']) if item['model'] else ''
+
+    return ITEM.format(
+        model=model, title=escape(item['title']), offers=offers,
+        asin=item['asin'], sales_rank=item['sales_rank'],
+        lowest=item['lowest'], currency=item['currency'])
+
+
+def make_response(items, operation='ItemSearch', total_results=None):
+    """Creates an Amazon API response
+
+    Args:
+        items (Iterable[dict]): The items (see `gen_items`)
+        operation (str): The API operation (default: 'ItemSearch')
+        total_results (int): Total number of search results (default: the
+            number of items)
+
+    Returns:
+        bytes: The response XML
+
+    Examples:
+        >>> response = make_response(gen_items(2))
+        >>> response.count(b'<Item>')
+        2
+    """
+    items = list(items)
+    total_results = len(items) if total_results is None else total_results
+    total_pages = -(-total_results // ITEMS_PER_PAGE)
+
+    response = RESPONSE.format(
+        operation=operation, namespace=NAMESPACE, total_pages=total_pages,
+        total_results=total_results, items=''.join(map(make_item, items)))
+
+    return response.encode('utf-8')
+
+
+def make_pages(count, **kwargs):
+    """Creates the ItemSearch response pages of a search
+
+    Args:
+        count (int): Total number of items
+        kwargs (dict): Keyword arguments passed to `gen_items`
+
+    Returns:
+        List[bytes]: The response XML of each page
+
+    Examples:
+        >>> len(make_pages(25))
+        3
+    """
+    items = list(gen_items(count, **kwargs))
+    step = ITEMS_PER_PAGE
+
+    return [
+        make_response(items[i:i + step], total_results=count)
+        for i in range(0, count, step)]
+
+
+class OfflineUpstream(object):
+    """Serves canned Amazon API responses with an injected latency
+
+    Use it as an `Amazon` `cache` to run the app without reaching Amazon.
+    Every search finds `total_results` items, and lookups find the items
+    that an earlier search returned.
+
+    Args:
+        latency (float): Seconds each response takes (default: 0.1)
+        total_results (int): Number of items each search finds (default: 50)
+
+    Examples:
+        >>> upstream = OfflineUpstream(latency=0)
+        >>> url = (
+        ...     'https://webservices.amazon.co.uk/onca/xml?ItemPage=2&'
+        ...     'Keywords=lego&Operation=ItemSearch')
+        >>> upstream.get(url).count(b'<Item>')
+        10
+        >>> b'GBP' in upstream.get(url)
+        True
+    """
+    def __init__(self, latency=0.1, total_results=50):
+        self.latency = latency
+        self.total_results = total_results
+        self.items = {}
+        self.lock = Lock()
+
+    def search(self, region, keywords='item', page=1):
+        end = min(page * ITEMS_PER_PAGE, self.total_results)
+        start = (page - 1) * ITEMS_PER_PAGE
+        kwargs = {'keywords': keywords, 'region': region}
+        items = list(gen_items(end, **kwargs))[start:]
+
+        with self.lock:
+            self.items.update(((region, i['asin']), i) for i in items)
+
+        return make_response(items, total_results=self.total_results)
+
+    def lookup(self, region, asins):
+        with self.lock:
+            items = [self.items.get((region, asin)) for asin in asins]
+
+        return make_response(filter(None, items), 'ItemLookup')
+
+    def get(self, url):
+        parsed = urlsplit(url)
+        query = dict((k, v[0]) for k, v in parse_qs(parsed.query).items())
+        region = REGIONS.get(parsed.netloc, 'US')
+        sleep(self.latency)
+
+        if query.get('Operation') == 'ItemLookup':
+            asins = query.get('ItemId', '').split(',')
+            response = self.lookup(region, asins)
+        else:
+            page = int(query.get('ItemPage', 1))
+            keywords = query.get('Keywords', 'item')
+            response = self.search(region, keywords, page)
+
+        return response
+
+    def set(self, url, text):
+        pass
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+    app.profiler
+    ~~~~~~~~~~~~
+
+    Provides opt-in per-request profiling
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import re
+import pstats
+
+from cProfile import Profile
+from datetime import datetime as dt
+from hashlib import sha1
+from hmac import compare_digest
+from os import getpid, makedirs, path as p
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+from flask import current_app as app, g, request
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+MAX_SLUG_LENGTH = 96
+SORT_KEYS = {'cumulative': 3, 'tottime': 2, 'calls': 1}
+
+
+def get_canonical_query(path, args):
+    """Creates a canonical query, i.e., the path and its sorted query
+    parameters
+
+    Args:
+        path (str): The request path
+        args (List[tuple]): The query parameter (name, value) pairs
+
+    Returns:
+        str: The canonical query
+
+    Examples:
+        >>> args = [('region', 'UK'), ('q', 'lego')]
+        >>> get_canonical_query('/search/', args) == (
+        ...     '/search/?q=lego&region=UK')
+        True
+    """
+    query = urlencode(sorted(args))
+    return '{}?{}'.format(path, query) if query else path
+
+
+def get_profile_name(canonical, utc=None):
+    """Creates a profile's file name from its canonical query
+
+    Args:
+        canonical (str): The canonical query (see `get_canonical_query`)
+        utc (obj): The request datetime (default: now)
+
+    Returns:
+        str: The file name
+
+    Examples:
+        >>> utc = dt(2017, 1, 2, 3, 4, 5, 6)
+        >>> get_profile_name('/search/?q=lego', utc).split('-')[:2] == [
+        ...     '20170102T030405.000006', 'search_q=lego']
+        True
+    """
+    utc = utc or dt.utcnow()
+    slug = re.sub(r'[^\w=.]+', '_', canonical).strip('_')[:MAX_SLUG_LENGTH]
+    digest = sha1(canonical.encode('utf-8')).hexdigest()[:8]
+    stamp = utc.strftime('%Y%m%dT%H%M%S.%f')
+    return '{}-{}-{}-{}.prof'.format(stamp, slug, digest, getpid())
+
+
+def should_profile():
+    """Determines if the current request should be profiled
+
+    Either `PROFILE` is set, or the request's `PROFILE_HEADER` header matches
+    `PROFILE_TOKEN`.
+    """
+    token = app.config.get('PROFILE_TOKEN')
+    value = request.headers.get(app.config.get('PROFILE_HEADER', 'X-Profile'))
+
+    if app.config.get('PROFILE'):
+        profile = True
+    elif token and value:
+        profile = compare_digest(value.encode('utf-8'), token.encode('utf-8'))
+    else:
+        profile = False
+
+    return profile
+
+
+def start_profile():
+    if should_profile():
+        g.profiler = Profile()
+        g.profiler.enable()
+
+
+def stop_profile():
+    profiler = getattr(g, 'profiler', None)
+
+    if profiler:
+        profiler.disable()
+        g.profiler = None
+
+    return profiler
+
+
+def save_profile(response):
+    profiler = stop_profile()
+
+    if profiler:
+        directory = app.config['PROFILE_DIR']
+        args = request.args.items(multi=True)
+        canonical = get_canonical_query(request.path, args)
+        name = get_profile_name(canonical)
+
+        if not p.isdir(directory):
+            try:
+                makedirs(directory)
+            except OSError:
+                # Another worker created it
+                pass
+
+        profiler.dump_stats(p.join(directory, name))
+        response.headers['X-Profile'] = name
+
+    return response
+
+
+def profile_requests(blueprint):
+    """Profiles the blueprint's requests when `should_profile` says so
+
+    Each profile is written to `PROFILE_DIR`, and its file name is sent in
+    the `X-Profile` response header.
+    """
+    blueprint.before_request(start_profile)
+    blueprint.after_request(save_profile)
+    blueprint.teardown_request(lambda exc: stop_profile())
+
+
+def summarize_profiles(paths, sort='cumulative', limit=20):
+    """Combines saved profiles and lists their hottest functions
+
+    Args:
+        paths (List[str]): The profile paths
+        sort (str): Column to sort by (one of ['cumulative', 'tottime',
+            'calls'], default: 'cumulative')
+        limit (int): Number of functions to list (default: 20)
+
+    Returns:
+        List[dict]: The function, number of calls, and its own and
+            cumulative time (in seconds)
+
+    Examples:
+        >>> from tempfile import NamedTemporaryFile
+        >>> profiler = Profile()
+        >>> result = profiler.runcall(get_canonical_query, '/', [])
+        >>> f = NamedTemporaryFile(suffix='.prof')
+        >>> profiler.dump_stats(f.name)
+        >>> rows = summarize_profiles([f.name, f.name])
+        >>> [r['calls'] for r in rows if 'get_canonical' in r['function']]
+        [2]
+    """
+    stats = pstats.Stats(*paths).stats
+    pos = SORT_KEYS[sort]
+    hottest = sorted(stats.items(), key=lambda s: s[1][pos], reverse=True)
+
+    return [
+        {
+            'function': '{}:{}({})'.format(*func), 'calls': values[1],
+            'tottime': values[2], 'cumtime': values[3]}
+        for func, values in hottest[:limit]]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    app.server
+    ~~~~~~~~~~
+
+    Provides the production server
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from os import getenv
+from multiprocessing import cpu_count
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+WORKER_CLASSES = {'sync': 'sync', 'threaded': 'gthread', 'gevent': 'gevent'}
+
+
+def get_workers(cpus=None):
+    """ Determines the number of workers to run
+
+    Uses `WEB_CONCURRENCY` if set, otherwise two workers per CPU plus one.
+
+    Args:
+        cpus (int): The number of CPUs (default: the number on this host)
+
+    Returns:
+        (int): The number of workers
+
+    Examples:
+        >>> get_workers(cpus=2) > 0
+        True
+    """
+    cpus = cpus or cpu_count()
+    return int(getenv('WEB_CONCURRENCY', cpus * 2 + 1))
+
+
+def serve(app, worker_class='threaded', **options):
+    """ Runs a preloaded app with gunicorn
+
+    The app is created (and its Swagger docs built) once in the master
+    process, and the workers share it copy-on-write after forking. So gevent
+    workers require the caller to `gevent.monkey.patch_all()` before the app
+    is imported.
+
+    Args:
+        app (obj): The Flask app
+        worker_class (str): The worker type (one of ['sync', 'threaded',
+            'gevent'], default: 'threaded')
+        options (dict): gunicorn settings, e.g., `bind`, `workers`,
+            `threads`, `timeout`, or `graceful_timeout`.
+    """
+    # gunicorn is only installed in production
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    options['workers'] = options.get('workers') or get_workers()
+    options['worker_class'] = WORKER_CLASSES[worker_class]
+    options['preload_app'] = True
+    Server().run()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+    app.suggest
+    ~~~~~~~~~~~
+
+    Provides an in-memory prefix index of the items seen in searches
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import re
+
+from collections import OrderedDict
+from heapq import nlargest
+from itertools import count
+from threading import Lock
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+# Longer query words are matched on their first `MAX_PREFIX` characters and
+# then checked against the item's words
+MAX_PREFIX = 8
+SUGGEST_FIELDS = ('asin', 'title', 'model')
+
+
+def get_words(text):
+    """Splits text into lowercase words
+
+    Examples:
+        >>> get_words('LEGO Star Wars: X-Wing') == [
+        ...     'lego', 'star', 'wars', 'x', 'wing']
+        True
+    """
+    return re.findall(r'\w+', (text or '').lower(), re.UNICODE)
+
+
+def get_prefixes(word):
+    return (word[:end] for end in range(1, min(len(word), MAX_PREFIX) + 1))
+
+
+class SuggestIndex(object):
+    """A bounded prefix index of item titles, models, and ASINs
+
+    Items are added as searches complete. Once `max_items` are indexed, the
+    least recently seen items are evicted. Suggestions are the most recently
+    seen items that have a word starting with each of the query words.
+
+    Args:
+        max_items (int): Max number of items to index (default: 10000)
+
+    Examples:
+        >>> index = SuggestIndex(max_items=2)
+        >>> index.add([
+        ...     {'asin': 'B01', 'country': 'US', 'title': 'Lego Star Wars'},
+        ...     {'asin': 'B02', 'country': 'US', 'title': 'Lego City'}])
+        >>> [s['asin'] for s in index.suggest('leg')]
+        ['B02', 'B01']
+        >>> [s['asin'] for s in index.suggest('lego st')]
+        ['B01']
+        >>> index.add([{'asin': 'B03', 'country': 'US', 'model': 'LG-3'}])
+        >>> [s['asin'] for s in index.suggest('lego')]
+        ['B02']
+        >>> [s['asin'] for s in index.suggest('b03')]
+        ['B03']
+        >>> index.suggest('lego', region='UK')
+        []
+    """
+    def __init__(self, max_items=10000):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.prefixes = {}
+        self.counter = count()
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get_keys(self, key, item):
+        region = key[0]
+        texts = [item.get(field) for field in SUGGEST_FIELDS]
+        words = set(word for text in texts for word in get_words(text))
+        prefixes = set(p for word in words for p in get_prefixes(word))
+        return words, [(region, prefix) for prefix in prefixes]
+
+    def remove(self, key):
+        entry = self.items.pop(key)
+
+        for prefix_key in entry['prefixes']:
+            keys = self.prefixes[prefix_key]
+            keys.discard(key)
+
+            if not keys:
+                del self.prefixes[prefix_key]
+
+    def add(self, items):
+        """Indexes (or refreshes) items
+
+        Args:
+            items (Iterable[dict]): The parsed Amazon items
+        """
+        with self.lock:
+            for item in (item for item in items if item.get('asin')):
+                key = (item.get('country', 'US'), item['asin'])
+                old = self.items.get(key, {'item': {}})['item']
+                new = dict(
+                    (f, item.get(f) or old.get(f)) for f in SUGGEST_FIELDS)
+
+                if key in self.items:
+                    self.remove(key)
+                elif len(self.items) >= self.max_items:
+                    self.remove(next(iter(self.items)))
+
+                words, prefix_keys = self.get_keys(key, new)
+                self.items[key] = {
+                    'item': new, 'words': words, 'prefixes': prefix_keys,
+                    'seen': next(self.counter)}
+
+                for prefix_key in prefix_keys:
+                    self.prefixes.setdefault(prefix_key, set()).add(key)
+
+    def suggest(self, query, region='US', limit=10):
+        """Gets the items matching a (partial) query
+
+        Args:
+            query (str): The query
+            region (str): The localized Amazon site (default: 'US')
+            limit (int): Max number of suggestions (default: 10)
+
+        Returns:
+            List[dict]: The matching items' `asin`, `title`, and `model`
+        """
+        words = get_words(query)
+
+        with self.lock:
+            sets = [
+                self.prefixes.get((region, word[:MAX_PREFIX]), set())
+                for word in words]
+
+            sets.sort(key=len)
+            keys = set.intersection(*sets) if sets else set()
+            long_words = [word for word in words if len(word) > MAX_PREFIX]
+            entries = [self.items[key] for key in keys]
+
+        if long_words:
+            entries = [
+                entry for entry in entries if all(
+                    any(w.startswith(word) for w in entry['words'])
+                    for word in long_words)]
+
+        best = nlargest(limit, entries, key=lambda entry: entry['seen'])
+        return [dict(entry['item']) for entry in best]
@@ -6,11 +6,24 @@
     Provides unit tests for the website.
 """
 
-from json import loads
+import socket
+
+from gzip import GzipFile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from json import dumps, loads
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import sleep, time
 
 import pytest
 
-from app import create_app
+from bottlenose.api import AmazonCall
+
+from app import create_app, jobs
+from app.offline import OfflineUpstream
+from app.utils import get, get_many
+from app.views import _get_amazon
 
 JSON = 'application/json'
 
@@ -27,6 +40,49 @@ def client(request):
     return client
 
 
+@pytest.fixture
+def offline(request):
+    # Answers from a fake Amazon, so no credentials are needed
+    app = create_app(config_mode='Test')
+    app.config.update(OFFLINE=True, OFFLINE_LATENCY=0)
+    client = app.test_client()
+    client.prefix = app.config['API_URL_PREFIX']
+    return client
+
+
+@pytest.fixture
+def slow(request, monkeypatch):
+    # Calls a fake Amazon that takes 0.2s per response (and honors the
+    # request timeout like `urlopen`)
+    upstream, latency = OfflineUpstream(0), 0.2
+
+    class Response(object):
+        def __init__(self, text):
+            self.text = text
+
+        def info(self):
+            return {'Content-Encoding': ''}
+
+        def read(self):
+            return self.text
+
+    def call_api(self, api_url, err_env):
+        sleep(min(latency, self.Timeout or latency))
+
+        if self.Timeout and self.Timeout < latency:
+            raise socket.timeout('timed out')
+
+        return Response(upstream.get(api_url))
+
+    monkeypatch.setattr(AmazonCall, '_call_api', call_api)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'key')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'secret')
+    app = create_app(config_mode='Test')
+    client = app.test_client()
+    client.prefix = app.config['API_URL_PREFIX']
+    return client
+
+
 def test_home(client):
     r = client.get('{}/'.format(client.prefix))
     assert r.status_code == 200
@@ -36,3 +92,236 @@ def test_search(client):
     r = client.get('{}/search/?q=lego'.format(client.prefix))
     assert r.status_code == 200
     assert 'lego' in get_json(r)['objects'][0]['title'].lower()
+
+
+def test_search_cached(offline):
+    url = '{}/search/?q=lego&limit=5'.format(offline.prefix)
+    first = offline.get(url)
+    second = offline.get(url)
+    assert get_json(first)['objects'] == get_json(second)['objects']
+    assert second.headers['X-Cache'] == 'HIT'
+
+
+def test_search_invalid(offline):
+    r = offline.get('{}/search/?q=lego&region=XX'.format(offline.prefix))
+    assert r.status_code == 400
+
+
+def test_item(offline):
+    r = offline.get('{}/search/?q=lego&limit=3'.format(offline.prefix))
+    asins = [item['asin'] for item in get_json(r)['objects']]
+    r = offline.get('{}/item/{}/'.format(offline.prefix, ','.join(asins)))
+    assert r.status_code == 200
+    assert [item['asin'] for item in get_json(r)['objects']] == asins
+
+
+def test_search_fields(offline):
+    url = '{}/search/?q=lego&fields=asin,title,price'.format(offline.prefix)
+    r = offline.get(url)
+    assert r.status_code == 200
+    assert set(get_json(r)['objects'][0]) == {'asin', 'title', 'price'}
+
+
+def test_search_sort(offline):
+    url = '{}/search/?q=lego&limit=20&sort=-price&top=3&fields=asin,price'
+    r = offline.get(url.format(offline.prefix))
+    prices = [item['price'] for item in get_json(r)['objects']]
+    assert r.status_code == 200
+    assert len(prices) <= 3
+    assert prices == sorted(prices, reverse=True)
+
+
+def test_suggest(offline):
+    offline.get('{}/search/?q=lego&limit=5'.format(offline.prefix))
+    r = offline.get('{}/suggest/?q=leg&limit=3'.format(offline.prefix))
+    titles = [item['title'] for item in get_json(r)['objects']]
+    assert r.status_code == 200
+    assert len(titles) == 3
+    assert all(title.lower().startswith('lego') for title in titles)
+
+    r = offline.get('{}/suggest/?q=leg&limit=-1'.format(offline.prefix))
+    assert r.status_code == 400
+
+
+def test_delete(offline):
+    url = '{}/search/?q=delete&limit=5'.format(offline.prefix)
+    assert offline.get(url).headers['X-Cache'] == 'MISS'
+    assert offline.get(url).headers['X-Cache'] == 'HIT'
+
+    r = offline.get('{}/delete/search/?q=delete&limit=5'.format(
+        offline.prefix))
+
+    assert r.status_code == 200
+    assert offline.get(url).headers['X-Cache'] == 'MISS'
+
+
+def test_item_max_asins(offline):
+    asins = ','.join('B{:09d}'.format(pos) for pos in range(101))
+    r = offline.get('{}/item/{}/'.format(offline.prefix, asins))
+    assert r.status_code == 400
+
+
+def test_search_deadline(slow):
+    url = '{}/search/?q=deadline&limit=50&timeout=0.5'.format(slow.prefix)
+    r = slow.get(url)
+    objects = get_json(r)['objects']
+    assert r.status_code == 200
+    assert get_json(r)['partial']
+    assert 0 < len(objects) < 50
+
+    # A partial result isn't cached as the full one
+    r = slow.get(url)
+    assert r.headers['X-Cache'] == 'MISS'
+    assert get_json(r)['partial']
+
+
+def test_jobs(offline):
+    url = '{}/jobs/?q=lego&limit=30&sort=price&top=5&format=csv'
+    r = offline.post(url.format(offline.prefix))
+    location = r.headers['Location']
+    assert r.status_code == 202
+    assert location.endswith('?format=csv')
+
+    deadline = time() + 5
+    url = location.replace('format=csv', 'format=json')
+
+    while get_json(offline.get(url))['objects']['status'] != 'done':
+        assert time() < deadline
+        sleep(0.05)
+
+    job = get_json(offline.get(url))['objects']
+    assert job['progress'] == len(job['objects']) == 5
+
+    r = offline.get(location)
+    assert r.status_code == 200
+    assert len(r.get_data(as_text=True).splitlines()) == 6
+
+
+def test_jobs_full(offline, monkeypatch):
+    monkeypatch.setattr(jobs, 'max_pending', 0)
+    r = offline.post('{}/jobs/?q=lego'.format(offline.prefix))
+    assert r.status_code == 503
+
+
+def test_search_table(offline):
+    url = '{}/search/?q=%3Dcmd&limit=3&fields=asin,title,price&format={}'
+    r = offline.get(url.format(offline.prefix, 'csv'))
+    rows = r.get_data(as_text=True).split('\r\n')
+    assert r.status_code == 200
+    assert r.mimetype == 'text/csv'
+    assert rows[0] == 'asin,title,price'
+    assert len(rows) == 5 and not rows[-1]
+
+    # Titles that look like formulas are escaped
+    assert rows[1].split(',')[1] == "'=cmd item #0"
+
+    headers = {'Accept-Encoding': 'gzip'}
+    r = offline.get(url.format(offline.prefix, 'tsv'), headers=headers)
+    text = GzipFile(fileobj=BytesIO(r.get_data())).read().decode('utf-8')
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert text.split('\n')[0] == 'asin\ttitle\tprice'
+    assert text.count('\n') == 4
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connections = 0
+    active = 0
+    max_active = 0
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    # Keeps connections alive so the pooled session can reuse them
+    protocol_version = 'HTTP/1.1'
+    lock = Lock()
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+
+        with self.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.lock:
+            self.server.active += 1
+            self.server.max_active = max(
+                self.server.max_active, self.server.active)
+
+        sleep(0.2)
+
+        with self.lock:
+            self.server.active -= 1
+
+        body = dumps({'path': self.path}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', JSON)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(request):
+    # A local fake upstream that answers each request after 0.2 seconds
+    server = FakeServer(('127.0.0.1', 0), FakeHandler)
+    Thread(target=server.serve_forever).start()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_pooled(server):
+    for _ in range(3):
+        r = get('{}/pooled'.format(server.url))
+        assert r['status'] == 200
+        assert r['path'] == '/pooled'
+        assert r['objects']['elapsed_time']
+
+    # The pooled session reuses a single connection
+    assert server.connections == 1
+
+
+def test_get_many(server):
+    urls = ['{}/{}'.format(server.url, num) for num in range(4)]
+    start = time()
+    results = get_many(urls)
+    assert time() - start < 0.6
+    assert server.max_active == 4
+    assert [r['path'] for r in results] == ['/0', '/1', '/2', '/3']
+    assert all(r['status'] == 200 for r in results)
+    assert all(r['objects']['elapsed_time'] for r in results)
+
+    # No more requests run at once than there are workers
+    start = time()
+    server.max_active = 0
+    results = get_many(urls, workers=2)
+    assert time() - start >= 0.4
+    assert server.max_active == 2
+    assert [r['path'] for r in results] == ['/0', '/1', '/2', '/3']
+
+
+def test_amazon_config(offline):
+    app = offline.application
+    app.config.update(
+        BREAKER_THRESHOLD=1, BREAKER_TIMEOUT=7, HEDGE_PERCENTILE=90)
+
+    with app.test_request_context():
+        amazon = _get_amazon(region='US')
+
+    assert amazon.hedge == 90
+    assert amazon.breaker.threshold == 1
+    assert amazon.breaker.reset_timeout == 7
+
+
+def test_history_days(client):
+    for route in ('history', 'summary'):
+        url = '{}/{}/B00TEST/?days={}'.format(client.prefix, route, '{}')
+        assert client.get(url.format(7)).status_code == 200
+
+        for days in ('0', '-1', 'nan', 'inf', 'week'):
+            r = client.get(url.format(days))
+            assert r.status_code == 400
@@ -8,6 +8,8 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import re
+
 from json import loads, dumps
 
 try:
@@ -20,23 +22,45 @@ try:
 except ImportError:
     from time import time as monotonic
 
+from os import getpid
 from ast import literal_eval
 from datetime import datetime as dt, timedelta
-from functools import wraps
+from numbers import Number
+from time import time
+from functools import partial, wraps
+from hashlib import sha1
+from multiprocessing.pool import ThreadPool
+from zlib import compress, compressobj, decompress, DEFLATED, MAX_WBITS
 
 import requests
-import pygogo as gogo
 
-from flask import make_response, request
+from requests.adapters import HTTPAdapter
+
+from flask import make_response, request, Response
 from dateutil.relativedelta import relativedelta
 from http.client import responses
 from meza import fntools as ft
 
-from app import cache
+from app import cache, SEARCH_RESULT
+from app.logs import get_logger
+from config import Config
 
 from builtins import *  # noqa  # pylint: disable=unused-import
 
-logger = gogo.Gogo(__name__, monolog=True).logger
+logger = get_logger(__name__)
+
+ITEM_FIELDS = frozenset(column['name'] for column in SEARCH_RESULT)
+TABLE_FIELDS = [column['name'] for column in SEARCH_RESULT]
+
+# The mimetype and delimiter of each table format. Don't add these mimetypes
+# to `COMPRESS_MIMETYPES`, Flask-Compress would buffer the whole stream.
+TABLE_FORMATS = {
+    'csv': ('text/csv', ','), 'tsv': ('text/tab-separated-values', '\t')}
+
+_SESSIONS = {}
+
+# Spreadsheets evaluate text cells that start with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
 
 # https://baconipsum.com/?paras=5&type=meat-and-filler&make-it-spicy=1
 BACON_IPSUM = [
@@ -90,6 +114,159 @@ def jsonify(status=200, indent=2, sort_keys=True, **kwargs):
     return response
 
 
+def format_cell(value):
+    """ Formats a table cell so a spreadsheet shows (and doesn't run) it
+
+    Examples:
+        >>> [format_cell(v) for v in ('=1+2', 'lego', -1.5, None)] == [
+        ...     "'=1+2", 'lego', '-1.5', '']
+        True
+    """
+    text = '' if value is None else str(value)
+    formula = text.startswith(FORMULA_PREFIXES)
+    return "'" + text if formula and not isinstance(value, Number) else text
+
+
+def format_row(values, delimiter=','):
+    """ Formats a row of a CSV (RFC 4180) or TSV file
+
+    Args:
+        values (Iterable): The row's values
+        delimiter (str): The field delimiter (default: ',')
+
+    Returns:
+        (str): The formatted row
+
+    Examples:
+        >>> row = format_row(['a', 'b,c', 'say "hi" now', None, 1.5])
+        >>> row == 'a,"b,c","say ""hi"" now",,1.5\\r\\n'
+        True
+        >>> format_row(['a\\tb', 'c'], '\\t') == 'a b\\tc\\n'
+        True
+        >>> format_row(['@SUM(A1)', 2]) == "'@SUM(A1),2\\r\\n"
+        True
+    """
+    texts = (format_cell(value) for value in values)
+
+    if delimiter == '\t':
+        # TSV fields can't contain tabs or line breaks
+        fields = (re.sub(r'[\t\r\n]', ' ', text) for text in texts)
+        row = '\t'.join(fields) + '\n'
+    else:
+        special = re.compile(r'[{}"\r\n]'.format(re.escape(delimiter)))
+        fields = (
+            '"{}"'.format(text.replace('"', '""'))
+            if special.search(text) else text for text in texts)
+
+        row = delimiter.join(fields) + '\r\n'
+
+    return row
+
+
+def gen_table(items, fields=None, delimiter=','):
+    """ Generates the rows of a CSV or TSV file, header first
+
+    Args:
+        items (Iterable[dict]): The items
+        fields (List[str]): The columns (default: `TABLE_FIELDS`)
+        delimiter (str): The field delimiter (default: ',')
+
+    Yields:
+        (str): A formatted row
+
+    Examples:
+        >>> items = [{'asin': 'B01', 'price': 9.99}]
+        >>> list(gen_table(items, ['asin', 'price'])) == [
+        ...     'asin,price\\r\\n', 'B01,9.99\\r\\n']
+        True
+    """
+    fields = fields or TABLE_FIELDS
+    yield format_row(fields, delimiter)
+
+    for item in items:
+        yield format_row((item.get(field) for field in fields), delimiter)
+
+
+def gen_gzipped(chunks, level=6):
+    """ Compresses a stream of bytes with gzip
+
+    Examples:
+        >>> from gzip import GzipFile
+        >>> from io import BytesIO
+        >>> gzipped = b''.join(gen_gzipped([b'a,b\\r\\n', b'1,2\\r\\n']))
+        >>> GzipFile(fileobj=BytesIO(gzipped)).read() == b'a,b\\r\\n1,2\\r\\n'
+        True
+    """
+    compressor = compressobj(level, DEFLATED, MAX_WBITS | 16)
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def get_table_format(table_format=None):
+    """ Validates a `format` query parameter
+
+    Args:
+        table_format (str): One of 'json' or the `TABLE_FORMATS` (default:
+            'json')
+
+    Returns:
+        (str): The table format, or None for json
+
+    Examples:
+        >>> get_table_format('CSV') == 'csv'
+        True
+        >>> get_table_format() is None
+        True
+    """
+    table_format = (table_format or 'json').lower()
+
+    if table_format != 'json' and table_format not in TABLE_FORMATS:
+        formats = ['json'] + sorted(TABLE_FORMATS)
+        msg = 'Invalid format: {}. Choose from {}.'
+        raise ValueError(msg.format(table_format, formats))
+
+    return None if table_format == 'json' else table_format
+
+
+def make_table_response(items, fields=None, table_format='csv', name='items'):
+    """ Creates a streamed CSV or TSV response
+
+    The rows are formatted (and gzipped if the client accepts it) as the
+    response is sent, so memory use doesn't grow with the number of rows.
+
+    Args:
+        items (Iterable[dict]): The items
+        fields (List[str]): The columns (default: `TABLE_FIELDS`)
+        table_format (str): One of the `TABLE_FORMATS` (default: 'csv')
+        name (str): The download's file name (without extension)
+
+    Returns:
+        (obj): Flask response
+    """
+    mimetype, delimiter = TABLE_FORMATS[table_format]
+    rows = gen_table(items, fields, delimiter)
+    body = (row.encode('utf-8') for row in rows)
+    encoding = request.headers.get('Accept-Encoding', '')
+    gzipped = 'gzip' in encoding.lower()
+    response = Response(gen_gzipped(body) if gzipped else body)
+    response.mimetype = mimetype
+
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+
+    disposition = 'attachment; filename={}.{}'.format(name, table_format)
+    response.headers['Content-Disposition'] = disposition
+    response.vary.add('Accept-Encoding')
+    response.last_modified = dt.utcnow()
+    return response
+
+
 def parse(string):
     """ Parses a string into an equivalent Python object
 
@@ -123,6 +300,156 @@ def make_cache_key(*args, **kwargs):
     return request.url
 
 
+def make_item_key(asin, region='US'):
+    """ Creates a memcache key for an Amazon item
+
+    Args:
+        asin (str): The item's Amazon Standard Identification Number
+        region (str): The localized Amazon site (default: 'US')
+
+    Returns:
+        (str): The cache key
+
+    Examples:
+        >>> make_item_key('B00005N5PF', 'UK') == 'item:UK:B00005N5PF'
+        True
+    """
+    return 'item:{}:{}'.format(region, asin)
+
+
+def find_items(asins, region='US', fields=None, stale=False):
+    """ Fetches whichever of the given ASINs are cached
+
+    Args:
+        asins (List[str]): The ASINs to fetch
+        region (str): The localized Amazon site (default: 'US')
+        fields (List[str]): The fields a cached item must have (default: all)
+        stale (bool): Include the items that are past their timeout (see
+            `set_items`)
+
+    Returns:
+        (dict): The cached items keyed by ASIN
+    """
+    fields = ITEM_FIELDS.intersection(fields or ITEM_FIELDS)
+    keys = [make_item_key(asin, region) for asin in asins]
+    entries = list(cache.get_many(*keys)) if keys else []
+    now = time()
+
+    usable = (
+        (asin, entry[1]) for asin, entry in zip(asins, entries)
+        if entry is not None and (stale or entry[0] > now))
+
+    return dict((asin, item) for asin, item in usable if fields.issubset(item))
+
+
+def get_items(asins, region='US', fields=None, stale=False):
+    """ Fetches cached items in the order of the given ASINs
+
+    Args:
+        asins (List[str]): The ASINs to fetch
+        region (str): The localized Amazon site (default: 'US')
+        fields (List[str]): The fields a cached item must have (default: all)
+        stale (bool): Include the items that are past their timeout
+
+    Returns:
+        (List[dict]): The cached items, or None if any item is missing
+    """
+    found = find_items(asins, region, fields, stale)
+    items = [found.get(asin) for asin in asins]
+    return None if None in items else items
+
+
+def set_items(items, timeout=None):
+    """ Caches items individually by ASIN and region
+
+    Items with only some of the fields never replace a cached item. Items
+    are kept (along with their expiration time) for `STALE_CACHE_TIMEOUT` so
+    they can be served as stale search results.
+
+    Args:
+        items (List[dict]): The parsed Amazon items
+        timeout (int): Seconds the items are fresh for (default:
+            `ITEM_CACHE_TIMEOUT`)
+    """
+    timeout = Config.ITEM_CACHE_TIMEOUT if timeout is None else timeout
+    expires = time() + timeout
+    kept = max(timeout, Config.STALE_CACHE_TIMEOUT)
+    mapping = {}
+
+    for item in (item for item in items if item.get('asin')):
+        key = make_item_key(item['asin'], item['country'])
+
+        if ITEM_FIELDS.issubset(item):
+            mapping[key] = (expires, item)
+        else:
+            cache.add(key, (expires, item), timeout=kept)
+
+    if mapping:
+        cache.set_many(mapping, timeout=kept)
+
+
+def project(items, fields=None):
+    """ Trims items to the given fields
+
+    Args:
+        items (Iterable[dict]): The items
+        fields (List[str]): The fields to keep (default: all)
+
+    Yields:
+        (dict): The trimmed item
+
+    Examples:
+        >>> item = {'asin': 'B00005N5PF', 'price': 9.99, 'title': 'Lego'}
+        >>> next(project([item], ['asin', 'price'])) == {
+        ...     'asin': 'B00005N5PF', 'price': 9.99}
+        True
+    """
+    for item in items:
+        if fields:
+            yield dict((field, item.get(field)) for field in fields)
+        else:
+            yield item
+
+
+def make_upstream_key(url):
+    """ Creates a memcache key for an Amazon API request
+
+    Args:
+        url (str): The request's canonical url (without the timestamp,
+            signature or credentials)
+
+    Returns:
+        (str): The cache key
+
+    Examples:
+        >>> url = 'https://webservices.amazon.com/onca/xml?ItemPage=1'
+        >>> make_upstream_key(url) == (
+        ...     'upstream:9e07fae96bb0bb7ae824ea58fcb92649f37eb5c2')
+        True
+    """
+    return 'upstream:{}'.format(sha1(url.encode('utf-8')).hexdigest())
+
+
+class UpstreamCache(object):
+    """ Caches compressed Amazon API responses
+
+    Responses are keyed by request (rather than by the url of the view that
+    made them), so all views share any page that was already fetched. See the
+    bottlenose `CacheReader` and `CacheWriter` docs.
+    """
+    def __init__(self, timeout=None, level=6):
+        self.timeout = timeout
+        self.level = level
+
+    def get(self, url):
+        value = cache.get(make_upstream_key(url))
+        return None if value is None else decompress(value)
+
+    def set(self, url, text):
+        value = compress(text, self.level)
+        cache.set(make_upstream_key(url), value, timeout=self.timeout)
+
+
 def fmt_elapsed(elapsed):
     """ Generates a human readable representation of elapsed time.
 
@@ -151,16 +478,69 @@ def fmt_elapsed(elapsed):
             yield '%d %s' % (value, attr[:-1] if value == 1 else attr)
 
 
-def get(url):
+def get_session(pool_size=None, retries=None):
+    """ Gets the process wide pooled HTTP session
+
+    The session keeps connections alive, so repeated requests to a host skip
+    the DNS lookup, TCP handshake, and TLS handshake. Forked processes get
+    their own session.
+
+    Args:
+        pool_size (int): Max connections kept per host (default:
+            `HTTP_POOL_SIZE`). Only used when the session is created.
+        retries (int): Number of connection retries (default: `HTTP_RETRIES`)
+
+    Returns:
+        (obj): requests Session
+
+    Examples:
+        >>> get_session() is get_session()
+        True
+    """
+    pid = getpid()
+
+    if pid not in _SESSIONS:
+        pool_size = pool_size or Config.HTTP_POOL_SIZE
+        retries = Config.HTTP_RETRIES if retries is None else retries
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=retries)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _SESSIONS.clear()
+        _SESSIONS[pid] = session
+
+    return _SESSIONS[pid]
+
+
+def get(url, timeout=None, **kwargs):
+    """ Fetches a JSON url with the pooled session
+
+    Args:
+        url (str): The url
+        timeout (float or tuple): The connect and read timeouts in seconds
+            (default: (`HTTP_CONNECT_TIMEOUT`, `HTTP_READ_TIMEOUT`))
+        kwargs (dict): Keyword arguments passed to `requests.Session.get`
+
+    Returns:
+        (dict): The response with its status and elapsed time
+    """
     start = monotonic()
-    r = requests.get(url)
+    timeout = timeout or (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
 
     try:
-        resp = r.json()
-    except JSONDecodeError as err:
-        resp = {'status': 500, 'message': err}
+        r = get_session().get(url, timeout=timeout, **kwargs)
+    except requests.RequestException as err:
+        resp = {'status': 503, 'message': err}
     else:
-        resp['status'] = r.status_code
+        try:
+            resp = r.json()
+        except JSONDecodeError as err:
+            resp = {'status': 500, 'message': err}
+        else:
+            resp['status'] = r.status_code
 
     elapsed_time = ', '.join(fmt_elapsed(monotonic() - start))
     resp['objects'] = {}
@@ -168,14 +548,49 @@ def get(url):
     return resp
 
 
+def get_many(urls, workers=None, **kwargs):
+    """ Fetches JSON urls concurrently with the pooled session
+
+    Args:
+        urls (List[str]): The urls
+        workers (int): Max number of concurrent requests (default: the
+            smaller of the number of urls and `HTTP_POOL_SIZE`)
+        kwargs (dict): Keyword arguments passed to `get`
+
+    Returns:
+        (List[dict]): The responses (see `get`) in the order of the urls
+
+    Examples:
+        >>> get_many([])
+        []
+    """
+    urls = list(urls)
+    workers = workers or min(len(urls), Config.HTTP_POOL_SIZE)
+    fetch = partial(get, **kwargs)
+
+    if workers > 1:
+        pool = ThreadPool(workers)
+
+        try:
+            results = pool.map(fetch, urls)
+        finally:
+            pool.close()
+    else:
+        results = list(map(fetch, urls))
+
+    return results
+
+
 # https://gist.github.com/glenrobertson/954da3acec84606885f5
 # http://stackoverflow.com/a/23115561/408556
 # https://github.com/pallets/flask/issues/637
-def cache_header(max_age, **ckwargs):
+def cache_header(max_age, cached=True, **ckwargs):
     """
     Add Flask cache response headers based on max_age in seconds.
 
     If max_age is 0, caching will be disabled.
+    If cached is False, only the headers are added and the view is responsible
+    for caching its own results
     Otherwise, caching headers are set to expire in now + max_age seconds
     If round_to_minute is True, then it will always expire at the start of a
     minute (seconds = 0)
@@ -189,7 +604,7 @@ def cache_header(max_age, **ckwargs):
 
     """
     def decorator(view):
-        f = cache.cached(max_age, **ckwargs)(view)
+        f = cache.cached(max_age, **ckwargs)(view) if cached else view
 
         @wraps(f)
         def wrapper(*args, **wkwargs):
@@ -8,35 +8,366 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+from os import getenv
 from random import choice
+from time import time
+from collections import OrderedDict
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
 
 try:
     from urllib.error import HTTPError
 except ImportError:
     from urllib2 import HTTPError
 
-from amazon.api import SearchException
-from flask import Blueprint, request
+from amazon.api import SearchException, LookupException, DOMAINS
+from flask import Blueprint, Response, request, url_for, current_app as app
 
 from config import Config
 
-from app import cache
-from app.api import Amazon
-from app.utils import make_cache_key, jsonify, BACON_IPSUM, cache_header
+from app import cache, history as prices, jobs as job_queue
+from app.api import (
+    Amazon, DeadlineExceeded, get_response_group, get_sort_key, select,
+    is_upstream_error, UPSTREAM_ERRORS)
+from app.breaker import get_breaker, CircuitOpen
+from app.jobs import JobFailed, QueueFull
+from app.logs import log_search
+from app.offline import OfflineUpstream
+from app.profiler import profile_requests, get_canonical_query
+from app.suggest import SuggestIndex
+from app.watch import Watcher, Target, PollFailed, WATCH_FIELDS
+from app.utils import (
+    make_cache_key, jsonify, BACON_IPSUM, cache_header, get_items,
+    find_items, set_items, UpstreamCache, project, ITEM_FIELDS,
+    get_table_format, make_table_response)
 
 from builtins import *  # noqa  # pylint: disable=unused-import
 
 blueprint = Blueprint('blueprint', __name__)
+profile_requests(blueprint)
 
 PREFIX = Config.API_URL_PREFIX
 CACHE_TIMEOUT = Config.CACHE_TIMEOUT
 
+FETCH_ERRORS = (
+    SearchException, LookupException, HTTPError, KeyError,
+    CircuitOpen) + UPSTREAM_ERRORS
+
+# Failed searches are cached (for a while depending on the error) so that
+# retrying them doesn't reach Amazon
+ERROR_TIMEOUTS = [
+    (HTTPError, Config.BAD_TAG_CACHE_TIMEOUT),
+    (SearchException, Config.NO_RESULT_CACHE_TIMEOUT)]
+
+CREDENTIALS_ERROR = 'Amazon credentials are missing'
+
+# Search params that are applied to the (cached) results, so they aren't part
+# of the search cache keys
+SELECTION_PARAMS = {
+    'format', 'fields', 'min_price', 'max_price', 'sort', 'top', 'timeout'}
+
+upstream = UpstreamCache(Config.UPSTREAM_CACHE_TIMEOUT)
+suggestions = SuggestIndex(Config.SUGGEST_MAX_ITEMS)
+_OFFLINE = {}
+
+
+def _get_upstream():
+    # Answers from canned responses (e.g., for load tests) when `OFFLINE`
+    if not app.config.get('OFFLINE'):
+        return upstream
+
+    latency = app.config.get('OFFLINE_LATENCY', 0)
+
+    if latency not in _OFFLINE:
+        _OFFLINE[latency] = OfflineUpstream(latency)
+
+    return _OFFLINE[latency]
+
+
+def _has_env_credentials():
+    return bool(getenv('AWS_ACCESS_KEY_ID') and getenv('AWS_SECRET_ACCESS_KEY'))
+
+
+def _has_credentials():
+    # The fake Amazon doesn't need any
+    return bool(app.config.get('OFFLINE') or _has_env_credentials())
+
+
+def _get_amazon(**kwargs):
+    region = kwargs.get('region', 'US')
+    kwargs['cache'] = _get_upstream()
+    kwargs['hedge'] = app.config.get('HEDGE_PERCENTILE')
+
+    if app.config.get('OFFLINE') and not _has_env_credentials():
+        kwargs.update(key='offline', secret='offline')
+
+    if region in DOMAINS:
+        threshold = app.config['BREAKER_THRESHOLD']
+        reset_timeout = app.config['BREAKER_TIMEOUT']
+        kwargs['breaker'] = get_breaker(
+            region, threshold, reset_timeout, is_upstream_error,
+            (DeadlineExceeded,))
+
+    return Amazon(**kwargs)
+
+
+def _get_fresh_amazon(region):
+    amazon = _get_amazon(region=region)
+
+    if not app.config.get('OFFLINE'):
+        # Skip (but still refresh) the cached responses
+        amazon.cache = None
+
+    return amazon
+
+
+def _watch_lookup(region, asins):
+    if not _has_credentials():
+        raise PollFailed(CREDENTIALS_ERROR)
+
+    amazon = _get_fresh_amazon(region)
+    status, result = _fetch(
+        amazon, 'lookup_n', asins, workers=1, fields=WATCH_FIELDS)
+
+    if status != 200:
+        raise PollFailed(result)
+
+    return result
+
+
+def _watch_search(region, keywords):
+    if not _has_credentials():
+        raise PollFailed(CREDENTIALS_ERROR)
+
+    amazon = _get_fresh_amazon(region)
+    limit = app.config['WATCH_SEARCH_LIMIT']
+    kwargs = {'Keywords': keywords, 'SearchIndex': 'All', 'Condition': 'New'}
+    status, result = _fetch(
+        amazon, 'fetch_n', limit, fields=WATCH_FIELDS, **kwargs)
+
+    if status != 200:
+        raise PollFailed(result)
+
+    return result
+
+
+watcher = Watcher(
+    _watch_lookup, _watch_search, Config.WATCH_INTERVAL, Config.WATCH_RATE)
+
+
+def _make_search_key(path=None):
+    # `path` defaults to the request's (the query is always the request's)
+    args = request.args.items(multi=True)
+    searched = [(k, v) for k, v in args if k not in SELECTION_PARAMS]
+    canonical = get_canonical_query(path or request.path, searched)
+    return 'search:{}'.format(canonical)
+
+
+def _make_stale_key(search_key=None):
+    return 'stale:{}'.format(search_key or _make_search_key())
+
+
+def _make_error_key(search_key=None):
+    return 'error:{}'.format(search_key or _make_search_key())
+
+
+def _get_error(amazon, err):
+    if isinstance(err, (SearchException, LookupException)):
+        result = str(err)
+        status = 500
+    elif isinstance(err, HTTPError):
+        msg = 'Amazon Associates tag {} is invalid for region {}'
+        result = msg.format(amazon.aws_associate_tag, amazon.region)
+        status = 503
+    elif isinstance(err, KeyError):
+        result = "region '{}' does not exist".format(amazon.region)
+        status = 400
+    else:
+        result = 'Amazon region {} is unavailable'.format(amazon.region)
+        status = 503
+
+    return status, result
+
+
+def _get_error_timeout(err):
+    # Amazon's server errors are transient, so only its client errors are
+    # cached
+    if isinstance(err, HTTPError) and not 400 <= err.code < 500:
+        timeout = None
+    else:
+        timeouts = (t for cls, t in ERROR_TIMEOUTS if isinstance(err, cls))
+        timeout = next(timeouts, None)
+
+    return timeout
+
+
+def _fetch_or_error(amazon, method, *args, **kwargs):
+    # Also returns the error, if any
+    try:
+        result = getattr(amazon, method)(*args, **kwargs)
+    except FETCH_ERRORS as err:
+        status, result = _get_error(amazon, err)
+        return status, result, err
+    else:
+        set_items(result)
+        prices.append(result)
+        suggestions.add(result)
+
+    return 200, result, None
+
+
+def _fetch(amazon, method, *args, **kwargs):
+    return _fetch_or_error(amazon, method, *args, **kwargs)[:2]
+
+
+def _get_fields(fields=None):
+    fields = [field for field in (fields or '').split(',') if field]
+    invalid = set(fields).difference(ITEM_FIELDS)
+
+    if invalid:
+        msg = 'Invalid field(s): {}. Choose from {}.'
+        raise ValueError(msg.format(', '.join(invalid), sorted(ITEM_FIELDS)))
+
+    return fields
+
+
+def _get_selection(kwargs):
+    selection = {}
+
+    for name in ('min_price', 'max_price'):
+        if kwargs.get(name):
+            selection[name] = float(kwargs.pop(name))
+
+    if kwargs.get('top'):
+        selection['top'] = int(kwargs.pop('top'))
+
+        if selection['top'] < 0:
+            raise ValueError('top must not be negative')
+
+    if kwargs.get('sort'):
+        selection['sort'] = kwargs.pop('sort')
+        get_sort_key(selection['sort'])
+
+    return selection
+
+
+def _get_fetched(fields, selection):
+    # Fetch the fields we filter and sort by even if they aren't returned
+    sort = selection.get('sort', '').lstrip('-')
+    priced = 'min_price' in selection or 'max_price' in selection
+    needed = ([sort] if sort else []) + (['price'] if priced else [])
+    return fields + [f for f in needed if f not in fields] if fields else []
+
+
+def _get_search(kwargs):
+    # Moves the search options out of the query `kwargs`
+    kwargs.setdefault('Keywords', kwargs.pop('q', None))
+    kwargs.setdefault('Condition', kwargs.pop('condition', 'New'))
+    limit = int(kwargs.pop('limit', 10))
+    fields = _get_fields(kwargs.pop('fields', None))
+    selection = _get_selection(kwargs)
+    fetched = _get_fetched(fields, selection)
+    region = kwargs.get('region', 'US')
+
+    if region not in DOMAINS:
+        raise ValueError("region '{}' does not exist".format(region))
+
+    group = get_response_group(fetched)
+    kwargs.update({'SearchIndex': 'All', 'ResponseGroup': group})
+    kwargs['fields'] = fetched
+    return limit, fields, selection
+
+
+def _make_items_response(items, fields, table_format=None, name='items',
+                         **extra):
+    # A table is streamed, so its items are only read as it is sent. Its
+    # flags are sent as headers.
+    if table_format:
+        response = make_table_response(items, fields, table_format, name)
+
+        if extra.get('partial'):
+            response.headers['X-Partial'] = 'true'
+    else:
+        response = jsonify(objects=list(items), **extra)
+
+    return response
+
+
+def _get_timeout(timeout=None):
+    timeout = app.config.get('API_TIMEOUT') if timeout is None else timeout
+    return None if timeout is None else float(timeout)
+
+
+def _get_stale(region, fields):
+    # The last good result, served while the region is unavailable
+    asins = cache.get(_make_stale_key())
+    return None if asins is None else get_items(asins, region, fields, True)
+
+
+def _search(limit, **kwargs):
+    if not _has_credentials():
+        return 503, CREDENTIALS_ERROR, False
+
+    amazon = _get_amazon(**kwargs)
+    status, result, error = _fetch_or_error(amazon, 'fetch_n', limit, **kwargs)
+    error_timeout = _get_error_timeout(error)
+
+    if status == 200 and not amazon.partial:
+        asins = [item['asin'] for item in result]
+        cache.set(_make_search_key(), asins, timeout=CACHE_TIMEOUT)
+        cache.set(_make_stale_key(), asins, Config.STALE_CACHE_TIMEOUT)
+    elif error_timeout:
+        cache.set(_make_error_key(), (status, result), timeout=error_timeout)
+
+    return status, result, amazon.partial
+
+
+def _search_job(limit, returned, selection, progress, **kwargs):
+    # `returned` are the fields to return, `kwargs['fields']` the ones to fetch
+    amazon = _get_amazon(**kwargs)
+
+    def report(items):
+        progress(len(items))
+
+    status, result = _fetch(
+        amazon, 'fetch_n', limit, progress=report, **kwargs)
+
+    if status != 200:
+        raise JobFailed(result)
+
+    return list(project(select(result, **selection), returned))
+
+
+def _get_search_result(limit, **kwargs):
+    # The search entry only holds the ordered ASINs, the items themselves are
+    # cached (and expire) individually
+    asins = cache.get(_make_search_key())
+    error = None if asins else cache.get(_make_error_key())
+    region, fields = kwargs.get('region', 'US'), kwargs['fields']
+    result = None if asins is None else get_items(asins, region, fields)
+    upstream_ms = None
+
+    if error:
+        (status, result), partial, outcome = error, False, 'HIT'
+    elif result is None:
+        start = monotonic()
+        status, result, partial = _search(limit, **kwargs)
+        upstream_ms = round((monotonic() - start) * 1000, 1)
+        outcome = 'MISS'
+    else:
+        status, partial, outcome = 200, False, 'HIT'
+
+    return status, result, partial, outcome, upstream_ms
+
 
 # API routes
 @blueprint.route('/search/')
 @blueprint.route('/api/search/')
 @blueprint.route('{}/search/'.format(PREFIX))
-@cache_header(CACHE_TIMEOUT, key_prefix=make_cache_key)
+@cache_header(CACHE_TIMEOUT, cached=False)
 def search():
     """Perform an Amazon site search
 
@@ -50,33 +381,374 @@ def search():
             (one of ['US', 'UK'], default: 'US')
 
         limit (int): Number of results to return (default: 10)
+
+        fields (str): Comma separated list of fields to return (any of
+            ['asin', 'country', 'currency', 'model', 'price', 'sales_rank',
+            'title', 'url'], default: all)
+
+        timeout (float): Seconds to wait for Amazon. The items found by then
+            are returned and marked `partial` (default: `API_TIMEOUT`)
+
+        min_price (float): Only return items that cost at least this much
+
+        max_price (float): Only return items that cost at most this much
+
+        sort (str): Field to sort by, prefixed with '-' for descending order
+            (one of ['price', 'sales_rank', '-price', '-sales_rank'])
+
+        top (int): Number of the (sorted) items to return (default: all)
+
+        format (str): The response format. Tables are streamed, and have the
+            `fields` as columns (one of ['json', 'csv', 'tsv'], default:
+            'json')
     """
     kwargs = request.args.to_dict()
-    kwargs.setdefault('Keywords', kwargs.pop('q', None))
-    kwargs.setdefault('Condition', kwargs.pop('condition', 'New'))
-    limit = int(kwargs.pop('limit', 10))
 
-    extra = {'SearchIndex': 'All', 'ResponseGroup': 'Medium'}
-    kwargs.update(extra)
-    amazon = Amazon(**kwargs)
+    try:
+        table_format = get_table_format(kwargs.pop('format', None))
+        kwargs['timeout'] = _get_timeout(kwargs.pop('timeout', None))
+        limit, fields, selection = _get_search(kwargs)
+    except ValueError as err:
+        response = jsonify(400, objects=str(err))
+        return log_search(response, region=kwargs.get('region', 'US'))
+
+    region = kwargs.get('region', 'US')
+    status, result, partial, outcome, upstream_ms = _get_search_result(
+        limit, **kwargs)
+
+    stale = _get_stale(region, kwargs['fields']) if status == 503 else None
+
+    if stale is not None:
+        status, result, outcome = 200, stale, 'STALE'
+
+    extra = {'partial': True} if partial else {}
+    extra.update({'stale': True} if outcome == 'STALE' else {})
+    selected = select(result, **selection) if status == 200 else []
+
+    if status == 200:
+        items = project(selected, fields)
+        response = _make_items_response(
+            items, fields, table_format, 'search', **extra)
+    else:
+        response = jsonify(status, objects=result, **extra)
+
+    response.headers['X-Cache'] = outcome
+    return log_search(
+        response, region=region, cache=outcome, upstream_ms=upstream_ms,
+        count=len(selected))
+
+
+@blueprint.route('/jobs/', methods=['POST'])
+@blueprint.route('/api/jobs/', methods=['POST'])
+@blueprint.route('{}/jobs/'.format(PREFIX), methods=['POST'])
+def jobs():
+    """Start a background Amazon site search for a large number of results
+
+    Takes the same parameters as `search` (in the query string or form).
+    Poll the `job` url returned in the `Location` header for the results.
+
+    Kwargs:
+        q (str): The search term (required)
+
+        condition (str): The item condition (one of ['New', 'Used'], default:
+            'New')
+
+        region (str): The localized Amazon site to search
+            (one of ['US', 'UK'], default: 'US')
+
+        limit (int): Number of results to return (default: 10, max:
+            `API_MAX_RESULTS_PER_PAGE`)
+
+        fields (str): Comma separated list of fields to return (any of
+            ['asin', 'country', 'currency', 'model', 'price', 'sales_rank',
+            'title', 'url'], default: all)
+
+        timeout (float): Seconds to wait for Amazon. The items found by then
+            are returned (default: no timeout)
+
+        min_price (float): Only return items that cost at least this much
+
+        max_price (float): Only return items that cost at most this much
+
+        sort (str): Field to sort by, prefixed with '-' for descending order
+            (one of ['price', 'sales_rank', '-price', '-sales_rank'])
+
+        top (int): Number of the (sorted) items to return (default: all)
+
+        format (str): The format of the `job` url's response (one of
+            ['json', 'csv', 'tsv'], default: 'json')
+    """
+    kwargs = request.values.to_dict()
+    timeout = kwargs.pop('timeout', None)
+    table_format = kwargs.pop('format', None)
 
     try:
-        response = amazon.search_n(limit, **kwargs)
-    except SearchException as err:
-        result = str(err)
-        status = 500
-    except HTTPError:
-        msg = 'Amazon Associates tag {} is invalid for region {}'
-        result = msg.format(amazon.aws_associate_tag, amazon.region)
-        status = 503
-    except KeyError:
-        result = "region '{}' does not exist".format(amazon.region)
-        status = 400
+        get_table_format(table_format)
+        kwargs['timeout'] = float(timeout) if timeout else None
+        limit, fields, selection = _get_search(kwargs)
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    if not _has_credentials():
+        return jsonify(503, objects=CREDENTIALS_ERROR)
+
+    limit = min(limit, app.config['API_MAX_RESULTS_PER_PAGE'])
+
+    try:
+        job_id = job_queue.submit(
+            _search_job, limit, fields, selection, **kwargs)
+    except QueueFull as err:
+        return jsonify(503, objects=str(err))
+
+    response = jsonify(202, objects=job_queue.get(job_id))
+    location = url_for('.job', job_id=job_id, format=table_format)
+    response.headers['Location'] = location
+    return response
+
+
+@blueprint.route('/job/<job_id>/')
+@blueprint.route('/api/job/<job_id>/')
+@blueprint.route('{}/job/<job_id>/'.format(PREFIX))
+def job(job_id):
+    """Get the status of a background search, and its results once done
+
+    Args:
+        job_id (str): The job id (returned by `jobs`)
+
+    Kwargs:
+        format (str): The response format. The tables only include the
+            results, so they are only sent once the job is done (one of
+            ['json', 'csv', 'tsv'], default: 'json')
+    """
+    try:
+        table_format = get_table_format(request.args.get('format'))
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    result = job_queue.get(job_id)
+
+    if result is None:
+        response = jsonify(
+            404, objects="job '{}' does not exist".format(job_id))
+    elif table_format and result['status'] == 'failed':
+        response = jsonify(500, objects=result['error'])
+    elif table_format and result['status'] != 'done':
+        response = jsonify(202, objects=result)
+    elif table_format:
+        response = make_table_response(
+            result['objects'], None, table_format, job_id)
     else:
-        result = list(amazon.parse(response))
-        status = 200
+        response = jsonify(objects=result)
+
+    return response
+
+
+@blueprint.route('/suggest/')
+@blueprint.route('/api/suggest/')
+@blueprint.route('{}/suggest/'.format(PREFIX))
+def suggest():
+    """Suggest Amazon items as a search term is typed
+
+    Only items that earlier searches returned are suggested (Amazon isn't
+    contacted), most recently seen first.
 
-    return jsonify(status, objects=result)
+    Kwargs:
+        q (str): The (partial) search term (required)
+
+        region (str): The localized Amazon site to search
+            (one of ['US', 'UK'], default: 'US')
+
+        limit (int): Max number of suggestions to return (default: 10)
+    """
+    kwargs = request.args.to_dict()
+
+    try:
+        limit = int(kwargs.get('limit', 10))
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    if limit < 0:
+        return jsonify(400, objects='limit must not be negative')
+
+    region = kwargs.get('region', 'US')
+    result = suggestions.suggest(kwargs.get('q', ''), region, limit)
+    return jsonify(objects=result)
+
+
+@blueprint.route('/watch/')
+@blueprint.route('/api/watch/')
+@blueprint.route('{}/watch/'.format(PREFIX))
+def watch():
+    """Stream the price changes of Amazon items as Server-Sent Events
+
+    Sends a `price` event with the latest values of each item, and then one
+    whenever an item's price, currency, or sales rank changes.
+
+    Kwargs:
+        asins (str): Comma separated list of ASINs to watch
+
+        q (str): Comma separated list of search terms whose first results to
+            watch
+
+        region (str): The localized Amazon site to watch
+            (one of ['US', 'UK'], default: 'US')
+    """
+    kwargs = request.args.to_dict()
+    region = kwargs.get('region', 'US')
+    asins = [a for a in kwargs.get('asins', '').split(',') if a]
+    queries = [q for q in kwargs.get('q', '').split(',') if q]
+    targets = [Target('asin', region, asin) for asin in asins]
+    targets += [Target('q', region, keywords) for keywords in queries]
+    max_targets = app.config['WATCH_MAX_TARGETS']
+
+    if region not in DOMAINS:
+        return jsonify(400, objects="region '{}' does not exist".format(region))
+    elif not targets:
+        return jsonify(400, objects='Choose asins or q to watch')
+    elif len(targets) > max_targets:
+        msg = 'Watch at most {} asins and search terms'.format(max_targets)
+        return jsonify(400, objects=msg)
+
+    watcher.start(app._get_current_object())
+    subscription = watcher.subscribe(targets)
+    stream = watcher.stream(subscription, app.config['WATCH_HEARTBEAT'])
+    response = Response(stream, mimetype='text/event-stream')
+    response.call_on_close(lambda: watcher.unsubscribe(subscription))
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@blueprint.route('/item/<asins>/')
+@blueprint.route('/api/item/<asins>/')
+@blueprint.route('{}/item/<asins>/'.format(PREFIX))
+@cache_header(CACHE_TIMEOUT, cached=False)
+def item(asins):
+    """Look up Amazon items by ASIN
+
+    Args:
+        asins (str): Comma separated list of ASINs (at most
+            `ITEM_MAX_ASINS`)
+
+    Kwargs:
+        region (str): The localized Amazon site to search
+            (one of ['US', 'UK'], default: 'US')
+
+        fields (str): Comma separated list of fields to return (any of
+            ['asin', 'country', 'currency', 'model', 'price', 'sales_rank',
+            'title', 'url'], default: all)
+
+        timeout (float): Seconds to wait for Amazon. The items found by then
+            are returned and marked `partial` (default: `API_TIMEOUT`)
+
+        format (str): The response format (one of ['json', 'csv', 'tsv'],
+            default: 'json')
+    """
+    kwargs = request.args.to_dict()
+    region = kwargs.get('region', 'US')
+    asins = list(OrderedDict.fromkeys(a for a in asins.split(',') if a))
+    max_asins = app.config['ITEM_MAX_ASINS']
+
+    if len(asins) > max_asins:
+        msg = 'at most {} asins can be looked up at once'.format(max_asins)
+        return jsonify(400, objects=msg)
+
+    try:
+        fields = _get_fields(kwargs.pop('fields', None))
+        timeout = _get_timeout(kwargs.pop('timeout', None))
+        table_format = get_table_format(kwargs.pop('format', None))
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    found = find_items(asins, region, fields)
+    missing = [asin for asin in asins if asin not in found]
+    extra = {}
+
+    if missing and not _has_credentials():
+        return jsonify(503, objects=CREDENTIALS_ERROR)
+    elif missing:
+        amazon = _get_amazon(**kwargs)
+        status, result = _fetch(
+            amazon, 'lookup_n', missing, fields=fields, timeout=timeout,
+            workers=app.config['LOOKUP_WORKERS'])
+
+        if status != 200:
+            return jsonify(status, objects=result)
+
+        found.update((i['asin'], i) for i in result)
+        extra = {'partial': True} if amazon.partial else {}
+
+    result = [found[asin] for asin in asins if asin in found]
+    items = project(result, fields)
+    response = _make_items_response(
+        items, fields, table_format, 'items', **extra)
+
+    response.headers['X-Cache'] = 'MISS' if missing else 'HIT'
+    return response
+
+
+def _get_window(days=None, **kwargs):
+    days = float(days or app.config['HISTORY_DAYS'])
+
+    # `not days > 0` also catches nan
+    if not days > 0 or days == float('inf'):
+        raise ValueError('days must be a positive number')
+
+    return {'start': int(time() - days * 86400)}
+
+
+@blueprint.route('/history/<asin>/')
+@blueprint.route('/api/history/<asin>/')
+@blueprint.route('{}/history/<asin>/'.format(PREFIX))
+def history(asin):
+    """Get the price history of an Amazon item
+
+    Args:
+        asin (str): The item's ASIN
+
+    Kwargs:
+        region (str): The localized Amazon site (one of ['US', 'UK'],
+            default: 'US')
+
+        days (int): Number of days of history to return (default: 30)
+    """
+    kwargs = request.args.to_dict()
+    region = kwargs.get('region', 'US')
+
+    try:
+        window = _get_window(**kwargs)
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    result = prices.series(asin, region, **window)
+    return jsonify(objects=result)
+
+
+@blueprint.route('/summary/<asin>/')
+@blueprint.route('/api/summary/<asin>/')
+@blueprint.route('{}/summary/<asin>/'.format(PREFIX))
+def summary(asin):
+    """Get the minimum, maximum, and latest price of an Amazon item
+
+    Args:
+        asin (str): The item's ASIN
+
+    Kwargs:
+        region (str): The localized Amazon site (one of ['US', 'UK'],
+            default: 'US')
+
+        days (int): Number of days to summarize (default: 30)
+    """
+    kwargs = request.args.to_dict()
+    region = kwargs.get('region', 'US')
+
+    try:
+        window = _get_window(**kwargs)
+    except ValueError as err:
+        return jsonify(400, objects=str(err))
+
+    result = prices.summary(asin, region, **window)
+    return jsonify(objects=result)
 
 
 # Cache routes
@@ -97,16 +769,40 @@ def lorem():
 @blueprint.route('/api/delete/<base>/')
 @blueprint.route('{}/delete/<base>/'.format(PREFIX))
 def delete(base):
-    """Delete a cached url
+    """Delete a cached url, including a search's stale and failed results
 
     Args:
         base (str): The base of the cached url to delete
     """
     url = request.url.replace('delete/', '')
-    cache.delete(url)
+    key = _make_search_key(request.path.replace('delete/', ''))
+
+    # `delete_many` stops at the first missing key
+    for cached in (url, key, _make_stale_key(key), _make_error_key(key)):
+        cache.delete(cached)
+
     return jsonify(objects='Key: {} deleted'.format(url))
 
 
+@blueprint.route('/stats/')
+@blueprint.route('/api/stats/')
+@blueprint.route('{}/stats/'.format(PREFIX))
+def stats():
+    """Get this process's cache storage counters
+
+    Return:
+        dict: Number of oversize (compressed) values, chunked values, chunks
+            written, chunked values read back with a chunk missing, values
+            read back from the disk cache, and values evicted from it
+    """
+    counters = dict(getattr(cache.cache, 'stats', {}))
+    names = [
+        'oversize', 'chunked', 'chunks', 'chunk_misses', 'disk_hits',
+        'evicted']
+    result = dict((name, counters.get(name, 0)) for name in names)
+    return jsonify(objects=result)
+
+
 @blueprint.route('/reset/')
 @blueprint.route('/api/reset/')
 @blueprint.route('{}/reset/'.format(PREFIX))
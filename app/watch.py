@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+    app.watch
+    ~~~~~~~~~
+
+    Provides a price watch scheduler that pushes changes to subscribers
+"""
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+from json import dumps
+from os import getpid
+from time import sleep
+from collections import defaultdict, namedtuple
+from threading import Thread, Lock
+
+import pygogo as gogo
+
+from app.api import MAX_LOOKUP_IDS
+
+from builtins import *  # noqa  # pylint: disable=unused-import
+
+logger = gogo.Gogo(__name__, monolog=True).logger
+
+WATCH_FIELDS = ['asin', 'price', 'currency', 'sales_rank']
+
+# `kind` is either 'asin' or 'q'
+Target = namedtuple('Target', ['kind', 'region', 'value'])
+
+
+def format_event(data, event=None):
+    """Formats a Server-Sent Event
+
+    Examples:
+        >>> format_event({'price': 1}, 'price') == (
+        ...     'event: price\\ndata: {"price": 1}\\n\\n')
+        True
+    """
+    lines = ['event: {}'.format(event)] if event else []
+    lines.append('data: {}'.format(dumps(data, sort_keys=True)))
+    return '\n'.join(lines) + '\n\n'
+
+
+class PollFailed(Exception):
+    pass
+
+
+class Subscription(object):
+    def __init__(self, targets):
+        self.targets = frozenset(targets)
+        self.queue = Queue()
+
+
+class Watcher(object):
+    """Polls the watched items and queries, and pushes price changes to
+    their subscribers
+
+    A single background thread polls each distinct item and query once per
+    cycle (no matter how many subscribers watch it). Items are looked up in
+    batches, and the upstream requests are spaced out to `rate` per second.
+    Only changes to the `price`, `currency`, or `sales_rank` are pushed.
+
+    Args:
+        lookup (func): Looks up the items of a region, i.e.,
+            `lookup(region, asins)`
+        search (func): Searches a region, i.e., `search(region, keywords)`
+        interval (float): Seconds between the start of each cycle
+            (default: 60)
+        rate (float): Max upstream requests per second (default: 1)
+
+    Examples:
+        >>> prices = {'A1': 10, 'B2': 20}
+        >>> def lookup(region, asins):
+        ...     return [
+        ...         {'asin': a, 'price': prices[a], 'currency': 'USD'}
+        ...         for a in asins]
+        >>> def search(region, keywords):
+        ...     return lookup(region, ['B2'])
+        >>> watcher = Watcher(lookup, search, rate=0)
+        >>> sub = watcher.subscribe([Target('asin', 'US', 'A1')])
+        >>> sub2 = watcher.subscribe([Target('q', 'US', 'lego')])
+        >>> watcher.cycle()
+        2
+        >>> sub.queue.get_nowait()['price'], sub2.queue.get_nowait()['price']
+        (10, 20)
+        >>> prices['B2'] = 19
+        >>> watcher.cycle()
+        1
+        >>> sub.queue.empty(), sub2.queue.get_nowait()['price']
+        (True, 19)
+        >>> watcher.unsubscribe(sub)
+        >>> sorted(t.value for t in watcher.targets)
+        ['lego']
+    """
+    def __init__(self, lookup, search, interval=60, rate=1):
+        self.lookup = lookup
+        self.search = search
+        self.interval = interval
+        self.rate = rate
+        self.subscribers = defaultdict(set)
+        self.values = {}
+        self.results = {}
+        self.lock = Lock()
+        self.app = None
+        self.pid = None
+
+    @property
+    def targets(self):
+        with self.lock:
+            return list(self.subscribers)
+
+    def start(self, app):
+        # Threads don't survive a fork so each worker process needs its own
+        if self.pid != getpid():
+            with self.lock:
+                if self.pid != getpid():
+                    self.app = app
+                    thread = Thread(target=self.run)
+                    thread.daemon = True
+                    thread.start()
+                    self.pid = getpid()
+
+    def run(self):
+        with self.app.app_context():
+            while True:
+                start = monotonic()
+
+                try:
+                    self.cycle()
+                except Exception as err:
+                    logger.error('Watch cycle failed: %s', err)
+
+                sleep(max(self.interval - (monotonic() - start), 1))
+
+    def subscribe(self, targets):
+        subscription = Subscription(targets)
+
+        with self.lock:
+            for target in subscription.targets:
+                self.subscribers[target].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for target in subscription.targets:
+                self.subscribers[target].discard(subscription)
+
+                if not self.subscribers[target]:
+                    del self.subscribers[target]
+
+    def gen_calls(self, targets):
+        asins = defaultdict(list)
+
+        for target in targets:
+            if target.kind == 'asin':
+                asins[target.region].append(target.value)
+            else:
+                yield [target], self.search, (target.region, target.value)
+
+        for region, values in asins.items():
+            for pos in range(0, len(values), MAX_LOOKUP_IDS):
+                batch = values[pos:pos + MAX_LOOKUP_IDS]
+                targets = [Target('asin', region, asin) for asin in batch]
+                yield targets, self.lookup, (region, batch)
+
+    def poll(self, targets):
+        results = {}
+
+        for pos, (polled, func, args) in enumerate(self.gen_calls(targets)):
+            if pos and self.rate:
+                sleep(1 / self.rate)
+
+            try:
+                items = func(*args)
+            except Exception as err:
+                logger.error('Polling %s failed: %s', args, err)
+                continue
+
+            for target in polled:
+                if target.kind == 'q':
+                    results[target] = items
+                else:
+                    results[target] = [
+                        item for item in items if item['asin'] == target.value]
+
+        return results
+
+    def get_event(self, region, item):
+        event = dict((field, item.get(field)) for field in WATCH_FIELDS)
+        event['region'] = region
+        return event
+
+    def prune(self, targets):
+        # Forget the values of items that are no longer watched. The caller
+        # must hold `self.lock`.
+        targets = set(targets)
+        results = self.results.items()
+        self.results = dict((t, a) for t, a in results if t in targets)
+        keys = set(
+            (t.region, asin) for t, asins in self.results.items()
+            for asin in asins)
+
+        keys.update((t.region, t.value) for t in targets if t.kind == 'asin')
+        self.values = dict((k, v) for k, v in self.values.items() if k in keys)
+
+    def publish(self, target, events):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(target, []))
+
+        for subscription in subscriptions:
+            for event in events:
+                subscription.queue.put(event)
+
+    def cycle(self):
+        """Polls every watched target once
+
+        Returns:
+            int: Number of items whose values changed
+        """
+        changed = {}
+        targets = self.targets
+
+        with self.lock:
+            self.prune(targets)
+
+        results = self.poll(targets)
+
+        # `snapshot` reads the results and values from request threads
+        with self.lock:
+            for target, items in results.items():
+                self.results[target] = [item['asin'] for item in items]
+
+                for item in items:
+                    key = (target.region, item['asin'])
+                    value = tuple(item.get(f) for f in WATCH_FIELDS[1:])
+
+                    if self.values.get(key) != value:
+                        self.values[key] = value
+                        changed[key] = self.get_event(target.region, item)
+
+        for target, items in results.items():
+            keys = ((target.region, item['asin']) for item in items)
+            events = [changed[key] for key in keys if key in changed]
+            self.publish(target, events)
+
+        return len(changed)
+
+    def snapshot(self, subscription):
+        """Gets the last known values of a subscription's items"""
+        with self.lock:
+            keys = []
+
+            for target in subscription.targets:
+                if target.kind == 'asin':
+                    asins = [target.value]
+                else:
+                    asins = self.results.get(target, [])
+
+                keys.extend((target.region, asin) for asin in asins)
+
+            values = [(key, self.values.get(key)) for key in keys]
+
+        for (region, asin), value in values:
+            if value:
+                event = dict(zip(WATCH_FIELDS, (asin,) + value))
+                yield dict(event, region=region)
+
+    def stream(self, subscription, heartbeat=15):
+        """Yields a subscription's Server-Sent Events
+
+        Starts with the last known values, and sends a comment every
+        `heartbeat` seconds without changes to keep the connection open. The
+        caller must `unsubscribe` once the client disconnects.
+        """
+        for event in self.snapshot(subscription):
+            yield format_event(event, 'price')
+
+        while True:
+            try:
+                event = subscription.queue.get(timeout=heartbeat)
+            except Empty:
+                yield ': keep-alive\n\n'
+            else:
+                yield format_event(event, 'price')
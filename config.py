@@ -43,6 +43,52 @@ class Config(object):
     ADMINS = frozenset([__EMAIL__])
     HOST = '127.0.0.1'
     CACHE_TIMEOUT = get_seconds(minutes=60)
+    ITEM_CACHE_TIMEOUT = get_seconds(minutes=30)
+    UPSTREAM_CACHE_TIMEOUT = get_seconds(minutes=30)
+    STALE_CACHE_TIMEOUT = get_seconds(hours=24)
+    BAD_TAG_CACHE_TIMEOUT = get_seconds(minutes=1)
+    NO_RESULT_CACHE_TIMEOUT = get_seconds(minutes=5)
+    BREAKER_THRESHOLD = 5
+    BREAKER_TIMEOUT = 30
+    HEDGE_PERCENTILE = None
+    API_TIMEOUT = 20
+    LOOKUP_WORKERS = 4
+    ITEM_MAX_ASINS = 100
+    HTTP_POOL_SIZE = 10
+    HTTP_RETRIES = 0
+    HTTP_CONNECT_TIMEOUT = 5
+    HTTP_READ_TIMEOUT = 30
+    MEMCACHE_POOL_SIZE = 8
+    MEMCACHE_BINARY = True
+    MEMCACHE_CONNECT_TIMEOUT = 1000
+    MEMCACHE_TIMEOUT = 1000
+    CACHE_COMPRESS_THRESHOLD = 64 * 1024
+    SHARED_CACHE = getenv('SHARED_CACHE', False)
+    SHARED_CACHE_PATH = None
+    SHARED_CACHE_SIZE = 64 * 1024 * 1024
+    DISK_CACHE = getenv('DISK_CACHE', False)
+    DISK_CACHE_PATH = p.join(PARENT_DIR, 'cache.db')
+    DISK_CACHE_SIZE = 256 * 1024 * 1024
+    OFFLINE = False
+    OFFLINE_LATENCY = 0.1
+    SEARCH_LOG_RATE = 1.0
+    PROFILE = False
+    PROFILE_TOKEN = getenv('PROFILE_TOKEN')
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_DIR = p.join(PARENT_DIR, 'profiles')
+    JOB_WORKERS = 2
+    JOB_TIMEOUT = get_seconds(hours=1)
+    JOB_MAX_PENDING = 100
+    WATCH_INTERVAL = 60
+    WATCH_RATE = 1
+    WATCH_HEARTBEAT = 15
+    WATCH_SEARCH_LIMIT = 10
+    WATCH_MAX_TARGETS = 50
+    SUGGEST_MAX_ITEMS = 10000
+    HISTORY_DB = p.join(PARENT_DIR, 'history.db')
+    HISTORY_BATCH_SIZE = 500
+    HISTORY_FLUSH_INTERVAL = 5
+    HISTORY_DAYS = 30
     APP_NAME = __APP_NAME__
 
     end = '-stage' if getenv('STAGE', False) else ''
@@ -75,3 +121,4 @@ class Development(Config):
 class Test(Config):
     TESTING = True
     DEBUG_MEMCACHE = False
+    HISTORY_DB = p.join(PARENT_DIR, 'history-test.db')
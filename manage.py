@@ -7,6 +7,10 @@ from __future__ import (
     absolute_import, division, print_function, with_statement,
     unicode_literals)
 
+import json
+import sys
+
+from glob import glob
 from os import path as p
 from subprocess import call, check_call, CalledProcessError
 
@@ -15,7 +19,20 @@ try:
 except ImportError:
     from urlparse import urlsplit
 
-from app import create_app
+# `serve_prod` preloads the app, so gevent has to patch the threads and locks
+# the app creates on import before it is imported (not in each worker)
+if 'serve_prod' in sys.argv and {
+        'gevent', '--worker-class=gevent', '-kgevent'}.intersection(sys.argv):
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app, cache as app_cache
+from app.bench import bench_parse, bench_docs, bench_cache
+from app.loadtest import (
+    format_summary, make_paths, make_app_get, make_http_get, run as run_load,
+    KEYWORDS, REGIONS)
+from app.profiler import summarize_profiles, SORT_KEYS
+from app.server import serve as serve_app, WORKER_CLASSES
 from flask import current_app as app
 from flask_script import Server, Manager
 
@@ -29,6 +46,16 @@ manager.add_option('-f', '--cfgfile', dest='config_file', type=p.abspath)
 manager.main = manager.run  # Needed to do `manage <command>` from the cli
 
 
+def _get_address():
+    if app.config.get('SERVER'):
+        parsed = urlsplit(app.config['SERVER'])
+        host, port = parsed.hostname, parsed.port or DEF_PORT
+    else:
+        host, port = app.config['HOST'], DEF_PORT
+
+    return host, port
+
+
 @manager.option('-h', '--host', help='The server host')
 @manager.option('-p', '--port', help='The server port')
 @manager.option(
@@ -37,12 +64,13 @@ def runserver(live=False, offline=False, timeout=None, **kwargs):
     # Overriding the built-in `runserver` behavior
     """Runs the flask development server"""
     with app.app_context():
-        if app.config.get('SERVER'):
-            parsed = urlsplit(app.config['SERVER'])
-            host, port = parsed.netloc, parsed.port or DEF_PORT
-        else:
-            host, port = app.config['HOST'], DEF_PORT
+        if timeout:
+            app.config['API_TIMEOUT'] = timeout
 
+        if offline:
+            app.config['OFFLINE'] = True
+
+        host, port = _get_address()
         kwargs.setdefault('host', host)
         kwargs.setdefault('port', port)
 
@@ -59,7 +87,8 @@ def runserver(live=False, offline=False, timeout=None, **kwargs):
 @manager.option('-p', '--port', help='The server port')
 @manager.option('-o', '--offline', help='Offline mode', action='store_true')
 @manager.option('-l', '--live', help='Use live data', action='store_true')
-@manager.option('-T', '--timeout', help='Fetch timeout', type=int)
+@manager.option(
+    '-T', '--timeout', help='Seconds to wait for Amazon', type=float)
 @manager.option(
     '-t', '--threaded', help='Run multiple threads', action='store_true')
 def serve(**kwargs):
@@ -68,6 +97,39 @@ def serve(**kwargs):
     runserver(**kwargs)
 
 
+@manager.option('-h', '--host', help='The server host')
+@manager.option('-p', '--port', help='The server port', type=int)
+@manager.option(
+    '-k', '--worker-class', help='The worker type', dest='worker_class',
+    choices=sorted(WORKER_CLASSES), default='threaded')
+@manager.option(
+    '-w', '--workers', help='Number of worker processes (default: '
+    '$WEB_CONCURRENCY or 2 * CPUs + 1)', type=int)
+@manager.option(
+    '-n', '--threads', help='Number of threads per threaded worker', type=int,
+    default=4)
+@manager.option(
+    '-T', '--timeout', help='Seconds before a silent worker is restarted',
+    type=int, default=30)
+@manager.option(
+    '-g', '--graceful-timeout', help='Seconds workers have to finish their '
+    'requests on restart', dest='graceful_timeout', type=int, default=30)
+@manager.option('-o', '--offline', help='Offline mode', action='store_true')
+def serve_prod(host=None, port=None, worker_class='threaded', offline=False,
+               **kwargs):
+    """Runs the production server with preforked workers"""
+    with app.app_context():
+        if offline:
+            app.config['OFFLINE'] = True
+
+        def_host, def_port = _get_address()
+        bind = '{}:{}'.format(host or def_host, port or def_port)
+        application = app._get_current_object()
+
+    # The app (and its Swagger docs) is created once before the workers fork
+    serve_app(application, worker_class, bind=bind, **kwargs)
+
+
 @manager.command
 def check():
     """Check staged changes for lint errors"""
@@ -130,6 +192,131 @@ def test(where, stop, **kwargs):
         exit(e.returncode)
 
 
+@manager.option(
+    '-n', '--count', help='Number of items', type=int, default=1000)
+@manager.option(
+    '-r', '--repeat', help='Number of runs', type=int, default=3)
+@manager.option(
+    '-d', '--docs', help='Benchmark docstring parsing', action='store_true')
+@manager.option(
+    '-c', '--cache', help='Benchmark the cache', action='store_true')
+@manager.option(
+    '-l', '--levels', help='Comma separated cache concurrency levels',
+    default='1,4,16,64')
+@manager.option(
+    '-R', '--region', help='The Amazon region to parse items from',
+    default='US')
+def bench(count, repeat, docs=False, cache=False, levels=None, region='US'):
+    """Run benchmarks"""
+    if cache:
+        with app.app_context():
+            backend = app_cache.cache
+            levels = [int(level) for level in levels.split(',')]
+            results = bench_cache(backend, levels, count)
+
+        msg = '{concurrency:>4} workers: {throughput:.0f} hits/s, '
+        msg += 'median: {median:.3f}ms, p99: {p99:.3f}ms'
+
+        for result in results:
+            print(msg.format(**result))
+    elif docs:
+        result = bench_docs(repeat)
+        msg = 'xml: {xml:.4f}s, direct: {direct:.4f}s, memoized: '
+        msg += '{memoized:.6f}s ({count} docstrings)'
+        print(msg.format(**result))
+        speedup = result['xml'] / result['direct']
+        print('direct is {:.1f}x faster'.format(speedup))
+    else:
+        result = bench_parse(count, repeat, region)
+        msg = 'parse: {parse:.4f}s, extract: {extract:.4f}s ({count} items)'
+        print(msg.format(**result))
+        speedup = result['parse'] / result['extract']
+        print('extract is {:.1f}x faster'.format(speedup))
+
+
+@manager.option(
+    '-u', '--url', help='Server to test over HTTP (default: test in-process)')
+@manager.option(
+    '-c', '--concurrency', help='Number of workers', type=int, default=8)
+@manager.option(
+    '-d', '--duration', help='Seconds to run for', type=float, default=10)
+@manager.option(
+    '-q', '--queries', help='Comma separated search terms',
+    default=','.join(KEYWORDS))
+@manager.option(
+    '-r', '--regions', help='Comma separated regions',
+    default=','.join(REGIONS))
+@manager.option(
+    '-s', '--skew', help='Zipf exponent of the query mix', type=float,
+    default=1.1)
+@manager.option(
+    '-l', '--limit', help='Number of results per search', type=int,
+    default=10)
+@manager.option(
+    '-o', '--offline', help='Use a fake Amazon (in-process only)',
+    action='store_true')
+@manager.option(
+    '-L', '--latency', help='Seconds each fake Amazon response takes',
+    type=float, default=0.1)
+@manager.option('-O', '--output', help='Save the results to a JSON file')
+def loadtest(url=None, offline=False, latency=0.1, output=None, **kwargs):
+    """Run a load test"""
+    keywords = kwargs.pop('queries').split(',')
+    regions = kwargs.pop('regions').split(',')
+    paths = make_paths(keywords, regions, kwargs.pop('limit'))
+
+    if url:
+        get = make_http_get(url)
+    else:
+        with app.app_context():
+            app.config.update(OFFLINE=offline, OFFLINE_LATENCY=latency)
+            get = make_app_get(app._get_current_object())
+
+    result = run_load(get, paths, **kwargs)
+    config = dict(kwargs, url=url, offline=offline, paths=len(paths))
+    result['config'] = dict(config, latency=latency if offline else None)
+
+    print(format_summary(result))
+
+    if result['errors']:
+        print('errors: {}'.format(result['errors']))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+        print('results saved to {}'.format(output))
+
+
+@manager.option(
+    '-d', '--dir', help='Profile directory (default: PROFILE_DIR)',
+    dest='directory')
+@manager.option(
+    '-p', '--pattern', help='Profile file name pattern', default='*.prof')
+@manager.option(
+    '-s', '--sort', help='Column to sort by', choices=sorted(SORT_KEYS),
+    default='cumulative')
+@manager.option(
+    '-n', '--limit', help='Number of functions to list', type=int, default=20)
+def profile(directory=None, pattern='*.prof', sort='cumulative', limit=20):
+    """Summarize the hottest functions of saved request profiles"""
+    with app.app_context():
+        directory = directory or app.config['PROFILE_DIR']
+
+    paths = sorted(glob(p.join(directory, pattern)))
+
+    if not paths:
+        exit('No profiles found in {}'.format(directory))
+
+    print('{} profiles in {}'.format(len(paths), directory))
+    print('{:>9} {:>10} {:>10}  {}'.format(
+        'calls', 'tottime', 'cumtime', 'function'))
+
+    for row in summarize_profiles(paths, sort, limit):
+        print('{calls:>9} {tottime:>10.4f} {cumtime:>10.4f}  {function}'.format(
+            **row))
+
+
 @manager.option('-r', '--remote', help='the heroku branch', default='staging')
 def add_keys(remote):
     """Deploy staging app"""